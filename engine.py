@@ -17,14 +17,52 @@ from states.state import State
 from states.state_manager import GameStateManager
 from states.title_state import TitleState
 from states.transition_state import TransitionState
+from physics.table import STEP_RATE
 from utils import BASE_SIZE
 
 
 pygame.init()
 
+class FixedTimestep:
+    """
+    Accumulates real frame time and hands it out as fixed physics steps.
+    rate: physics steps per second
+    max_substeps: most steps run in one frame, time beyond that is dropped so a hitch can't snowball
+    """
+    def __init__(self, rate: float, max_substeps: int) -> None:
+        self.step = 1 / rate
+        self.max_substeps = max_substeps
+        self.accumulator = 0
+
+    def advance(self, frame_time: float) -> int:
+        """
+        Add frame_time to the accumulator, returns how many steps to run this frame
+        """
+        self.accumulator += frame_time
+        steps = min(int(self.accumulator / self.step), self.max_substeps)
+        self.accumulator -= steps * self.step
+        if self.accumulator >= self.step:
+            self.accumulator = self.accumulator % self.step
+        return steps
+
+    @property
+    def alpha(self) -> float:
+        """
+        How far the current frame is between the previous and the next physics step
+        """
+        return self.accumulator / self.step
+
 class Game:
-    def __init__(self) -> None:
+    def __init__(self, recorder=None, dirty_rects=False) -> None:
+        """
+        recorder: optional harness.EventRecorder every frame's time and events are written to
+        dirty_rects: only redraw and update the parts of the screen the states report as changed
+        """
         self.running = False
+        self.recorder = recorder
+        self.dirty_rects = dirty_rects
+        # States drawn last frame, the stack below the topmost opaque one is skipped
+        self.rendered: list[State] = []
         self.display = pygame.display.set_mode(BASE_SIZE)
         self.screen = pygame.Surface(BASE_SIZE)
         self.screen = self.screen.convert()
@@ -33,6 +71,9 @@ class Game:
         print(self.asset_cache.asset_manager.assets)
 
         self.clock = pygame.time.Clock()
+        self.timestep = FixedTimestep(PHYSICS_RATE, MAX_SUBSTEPS)
+        # Events from frames that ran no physics step, handed to the next one
+        self.pending_events: list[pygame.event.Event] = []
         self.font = ui.Font(20, BASE_SIZE[0], False, False)
         self.gsm = GameStateManager()
         title = TitleState(BASE_SIZE, self.font, self.play, self.quit)
@@ -42,15 +83,31 @@ class Game:
     def run(self):
         self.running = True
         while self.running:
-            delta = self.clock.tick(FPS) / 1000
+            frame_time = self.clock.tick(FPS) / 1000
             events = pygame.event.get()
+            if self.recorder is not None:
+                self.recorder.record(frame_time, events)
+            self.frame(frame_time, events)
+
+    def frame(self, frame_time: float, events: list[pygame.event.Event]):
+        """
+        Run the physics steps due after frame_time seconds and draw the result
+        """
+        self.pending_events.extend(events)
 
-            self.update(delta, events)
+        for _ in range(self.timestep.advance(frame_time)):
+            self.update(self.timestep.step, self.pending_events)
+            self.pending_events = []
 
-            self.render()
-            self.display.blit(self.screen, (0, 0))
+        if not self.gsm.peek().needs_render:
+            return
+        if self.dirty_rects:
+            self.render_dirty()
+            return
+        self.render()
+        self.display.blit(self.screen, (0, 0))
 
-            pygame.display.flip()
+        pygame.display.flip()
 
     def handle_events(self, events: list[pygame.event.Event]):
         for event in events:
@@ -74,7 +131,15 @@ class Game:
         print("Quitting")
         self.running = False
 
-    def transition(self, state=None):
+    def transition(self, state=None, crossfade=False):
+        """
+        Fade to state, or back to the state below the current one if state is None.
+        crossfade: enter the next state straight away and fade the last frame out over it
+        """
+        if crossfade:
+            self.crossfade(state)
+            return
+
         def fade_out_done():
             print("Fade out done")
             self.gsm.pop()
@@ -86,7 +151,24 @@ class Game:
 
         self.gsm.push(
             TransitionState(
-                fade_out_done, 2, (0, 0, 0), self.screen.get_size(), TransitionState.OUT
+                fade_out_done, 2, (0, 0, 0), self.screen.get_size(), TransitionState.OUT, freeze=True
+            ), self.asset_cache
+        )
+
+    def crossfade(self, state=None):
+        def crossfade_done():
+            print("Crossfade done")
+            self.gsm.pop()
+
+        # The screen still holds the last frame drawn
+        frozen = self.screen.copy()
+        if state is not None:
+            self.gsm.push(state, self.asset_cache)
+        else:
+            self.gsm.pop()
+        self.gsm.push(
+            TransitionState(
+                crossfade_done, 1.5, (0, 0, 0), self.screen.get_size(), TransitionState.IN, frozen=frozen
             ), self.asset_cache
         )
 
@@ -106,7 +188,8 @@ class Game:
         Handle input, and update the top state in the stack
         """
         self.handle_events(events)
-        self.gsm.peek().update(delta, events)
+        for state in self.gsm.active():
+            state.update(delta, events)
 
     def render(self):
         """
@@ -114,10 +197,50 @@ class Game:
         """
         self.display.fill((255, 255, 255))
         self.screen.fill((255, 255, 255))
-        for state in self.gsm.states:
+        self.rendered = self.gsm.visible()
+        for state in self.rendered:
+            state.interpolation = self.timestep.alpha
+        self.render_states()
+
+    def render_states(self):
+        for state in self.rendered:
             state.render(self.screen)
-        
-    
+
+    def render_dirty(self):
+        """
+        Redraw only the regions the states report as changed, clipped to their bounding rect
+        """
+        visible = self.gsm.visible()
+        # A state that was hidden last frame has to be drawn in full
+        rects = [] if visible == self.rendered else None
+        for state in visible:
+            state.interpolation = self.timestep.alpha
+            regions = state.dirty_regions()
+            # Every state is asked so each keeps track of what it drew
+            if regions is None or rects is None:
+                rects = None
+            else:
+                rects.extend(regions)
+
+        if rects is None:
+            self.render()
+            self.display.blit(self.screen, (0, 0))
+            pygame.display.flip()
+            return
+        if not rects:
+            return
+
+        self.rendered = visible
+        area = rects[0].unionall(rects[1:]).clip(self.screen.get_rect())
+        self.screen.set_clip(area)
+        self.screen.fill((255, 255, 255))
+        self.render_states()
+        self.screen.set_clip(None)
+        for rect in rects:
+            self.display.blit(self.screen, rect, rect)
+        pygame.display.update(rects)
+
+
 
 
 def main():
@@ -127,6 +250,9 @@ def main():
 
 
 FPS = 60
+# FRICTION is applied once per step and tuned for STEP_RATE, replays record it as their step rate
+PHYSICS_RATE = STEP_RATE
+MAX_SUBSTEPS = 5
 if __name__ == "__main__":
     # logger, handler = log.setup_logs("Game Jam", logging.DEBUG)
     main()
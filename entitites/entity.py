@@ -1,27 +1,57 @@
 from pygame.rect import Rect
-from pygame.sprite import Sprite
 from pygame.math import Vector2
 from pygame.surface import Surface
 import pygame.transform
 
-class Entity(Sprite):
-    def __init__(self, image: Surface, size:tuple, pos:tuple=None) -> None:
-        super().__init__()
+class Entity:
+    """
+    Image drawn centred on a position.
+    Updates and renders work in place on the entity's own vectors and rects
+    """
+    __slots__ = ("position", "previous_position", "rect", "image", "area", "_render_rect")
 
+    def __init__(self, image: Surface, size:tuple, pos:tuple=None, area: Rect=None) -> None:
+        """
+        area: the part of image to draw, e.g. a sprite in an atlas, the whole image if None
+        """
         if pos == None:
             pos = (0,0)    
         self.position = Vector2(pos)
+        # Position at the start of the latest physics step, for render interpolation
+        self.previous_position = Vector2(pos)
         self.rect = Rect(pos[0], pos[1], size[0], size[1])
-        if image.get_width() == size[0] and image.get_height() == size[1]:
+        # Scratch rect for interpolated rendering
+        self._render_rect = Rect(self.rect)
+        self.area = area
+        if area is not None or (image.get_width() == size[0] and image.get_height() == size[1]):
             self.image = image
         else:
             s = (int(size[0]), int(size[1]))
             im = pygame.transform.scale(image, s)
             self.image = im
 
-    def render(self, screen: Surface):
-        screen.blit(self.image, self.rect)
+    def draw_rect(self, alpha: float = 1) -> Rect:
+        """
+        Where render draws the image, the rect may be reused by the next call
+        """
+        if alpha >= 1 or self.previous_position == self.position:
+            return self.rect
+        previous = self.previous_position
+        position = self.position
+        r = self._render_rect
+        r.centerx = previous.x + (position.x - previous.x) * alpha
+        r.centery = previous.y + (position.y - previous.y) * alpha
+        return r
+
+    def render(self, screen: Surface, alpha: float = 1):
+        screen.blit(self.image, self.draw_rect(alpha), self.area)
+
+    def snapshot(self):
+        """
+        Call before each physics step
+        """
+        self.previous_position.update(self.position)
 
     def update(self, delta, **kwargs):
-        self.rect.center = [self.position.x, self.position.y]
-        
+        self.rect.centerx = self.position.x
+        self.rect.centery = self.position.y
@@ -6,6 +6,8 @@ from pygame import K_LEFT, K_RIGHT, K_DOWN, K_UP
 class Player(Entity):
     DAMP = 0.98
     ACCEL_SPEED = 2000
+    __slots__ = ("velocity", "force", "mass", "move_y")
+
     def __init__(self, image: Surface, size: tuple, pos: tuple = None, mass=10, move_y=True) -> None:
         self.velocity = Vector2(0,0)
         self.force = Vector2(0,0)
@@ -17,9 +19,11 @@ class Player(Entity):
         """
         Call this after do_movement (or after self.force != (0,0))
         """
-        self.velocity += (self.force / self.mass) * delta
-        self.velocity *= Player.DAMP
-        self.position += self.velocity * delta
+        k = delta / self.mass
+        self.velocity.x = (self.velocity.x + self.force.x * k) * Player.DAMP
+        self.velocity.y = (self.velocity.y + self.force.y * k) * Player.DAMP
+        self.position.x += self.velocity.x * delta
+        self.position.y += self.velocity.y * delta
         super().update(delta)
         self.force.x = 0
         self.force.y = 0
@@ -0,0 +1,44 @@
+import pygame
+from pygame.rect import Rect
+from pygame.surface import Surface
+
+
+class SpriteAtlas:
+    """
+    Equally sized sprites packed into one surface, shared by every entity drawn with them.
+    Entities keep the atlas as their image and their sprite's rect as their area,
+    so a whole batch can be drawn with one Surface.blits
+    """
+    def __init__(self, cell_size: tuple, capacity: int, colorkey=(0, 0, 0)) -> None:
+        self.cell_size = (int(cell_size[0]), int(cell_size[1]))
+        self.capacity = capacity
+        self.colorkey = colorkey
+        surface = Surface((self.cell_size[0] * capacity, self.cell_size[1]))
+        if pygame.display.get_surface() is not None:
+            surface = surface.convert()
+        surface.fill(colorkey)
+        surface.set_colorkey(colorkey)
+        self.surface = surface
+        # Sprite key: area of the surface
+        self.areas: dict = {}
+
+    def sprite(self, key, draw) -> Rect:
+        """
+        Area of the sprite for key, draw(surface, rect) paints it the first time it's asked for.
+        Unpainted pixels stay the colour key
+        """
+        area = self.areas.get(key)
+        if area is not None:
+            return area
+        if len(self.areas) == self.capacity:
+            raise ValueError(f"sprite atlas is full, it holds {self.capacity} sprites")
+        area = Rect(len(self.areas) * self.cell_size[0], 0, self.cell_size[0], self.cell_size[1])
+        # Keep drawing inside the cell
+        self.surface.set_clip(area)
+        draw(self.surface, area)
+        self.surface.set_clip(None)
+        self.areas[key] = area
+        return area
+
+    def __len__(self) -> int:
+        return len(self.areas)
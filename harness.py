@@ -0,0 +1,180 @@
+"""
+Record a play session and replay it as a benchmark.
+    python harness.py record session.jsonl
+    python harness.py replay session.jsonl [--realtime] [--dirty-rects] [--json]
+
+A recording is one JSON line per frame with the frame time and the pygame events of
+that frame. Replaying runs the whole game with the dummy video driver, feeding it the
+recorded frames, and reports update and render times per state.
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import time
+
+
+def encode_event(event) -> dict or None:
+    # Only keep attributes that survive a round trip through JSON
+    attributes = {}
+    for key, value in event.dict.items():
+        if isinstance(value, (bool, int, float, str)) or value is None:
+            attributes[key] = value
+        elif isinstance(value, (tuple, list)) and all(isinstance(v, (int, float)) for v in value):
+            attributes[key] = list(value)
+    return {"type": event.type, "dict": attributes}
+
+
+def decode_event(data: dict):
+    import pygame.event
+
+    attributes = {key: tuple(value) if isinstance(value, list) else value for key, value in data["dict"].items()}
+    return pygame.event.Event(data["type"], attributes)
+
+
+class EventRecorder:
+    """
+    Writes each frame's time and events, pass it to Game
+    """
+    def __init__(self, path) -> None:
+        self.file = open(path, "w")
+
+    def record(self, frame_time: float, events):
+        self.file.write(json.dumps({"t": frame_time, "events": [encode_event(event) for event in events]}) + "\n")
+
+    def close(self):
+        self.file.close()
+
+
+def read_frames(path) -> list[tuple]:
+    frames = []
+    with open(path) as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                frame = json.loads(line)
+                frames.append((frame["t"], [decode_event(event) for event in frame["events"]]))
+    return frames
+
+
+def benchmark_game(dirty_rects=False):
+    # engine initialises pygame on import, so the driver has to be chosen first
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+    from engine import Game
+
+    class BenchmarkGame(Game):
+        """
+        Game that times every update and every state's render
+        """
+        def __init__(self) -> None:
+            super().__init__(dirty_rects=dirty_rects)
+            # State class name: list of seconds
+            self.update_times: dict[str, list[float]] = {}
+            self.render_times: dict[str, list[float]] = {}
+
+        def update(self, delta, events):
+            name = type(self.gsm.peek()).__name__
+            start = time.perf_counter()
+            super().update(delta, events)
+            self.update_times.setdefault(name, []).append(time.perf_counter() - start)
+
+        def render_states(self):
+            for state in self.rendered:
+                start = time.perf_counter()
+                state.render(self.screen)
+                self.render_times.setdefault(type(state).__name__, []).append(time.perf_counter() - start)
+
+    return BenchmarkGame()
+
+
+def replay(path, realtime=False, dirty_rects=False) -> dict:
+    """
+    Play a recording through the game, returns the timings
+    """
+    frames = read_frames(path)
+    game = benchmark_game(dirty_rects)
+    game.running = True
+    start = time.perf_counter()
+    elapsed = 0
+    played = 0
+    for frame_time, events in frames:
+        if not game.running:
+            break
+        if realtime:
+            elapsed += frame_time
+            delay = start + elapsed - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+        game.frame(frame_time, events)
+        played += 1
+    wall = time.perf_counter() - start
+
+    return {
+        "frames": played,
+        "recorded_seconds": sum(frame_time for frame_time, _ in frames[:played]),
+        "wall_seconds": wall,
+        "update": {name: summarize(times) for name, times in game.update_times.items()},
+        "render": {name: summarize(times) for name, times in game.render_times.items()},
+    }
+
+
+def summarize(times: list[float]) -> dict:
+    ordered = sorted(times)
+    return {
+        "count": len(times),
+        "mean_ms": statistics.fmean(times) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p95_ms": ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000,
+        "max_ms": ordered[-1] * 1000,
+    }
+
+
+def report(result: dict, out):
+    out.write(f"{result['frames']} frames, {result['recorded_seconds']:.2f}s recorded, {result['wall_seconds']:.2f}s to replay\n")
+    out.write(f"{'':7} {'state':22} {'count':>7} {'mean ms':>9} {'p50 ms':>9} {'p95 ms':>9} {'max ms':>9}\n")
+    for kind in ("update", "render"):
+        for name, s in result[kind].items():
+            out.write(
+                f"{kind:7} {name:22} {s['count']:>7} {s['mean_ms']:>9.3f} {s['p50_ms']:>9.3f} {s['p95_ms']:>9.3f} {s['max_ms']:>9.3f}\n"
+            )
+
+
+def record(path):
+    from engine import Game
+    import pygame
+
+    recorder = EventRecorder(path)
+    try:
+        Game(recorder).run()
+    finally:
+        recorder.close()
+        pygame.quit()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Record and replay game sessions for benchmarking")
+    commands = parser.add_subparsers(dest="command", required=True)
+    record_parser = commands.add_parser("record", help="play the game and record the input")
+    record_parser.add_argument("path")
+    replay_parser = commands.add_parser("replay", help="replay a recording headlessly and time it")
+    replay_parser.add_argument("path")
+    replay_parser.add_argument("--realtime", action="store_true", help="keep the recorded frame pacing instead of running flat out")
+    replay_parser.add_argument("--dirty-rects", action="store_true", help="only redraw the parts of the screen that changed")
+    replay_parser.add_argument("--json", action="store_true", help="write the timings as JSON")
+    args = parser.parse_args(argv)
+
+    if args.command == "record":
+        record(args.path)
+        return
+    result = replay(args.path, args.realtime, args.dirty_rects)
+    if args.json:
+        json.dump(result, sys.stdout, indent=2)
+        sys.stdout.write("\n")
+    else:
+        report(result, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,89 @@
+"""
+Headless shot simulation.
+Reads one JSON shot per line and writes one JSON outcome per line, e.g.
+    python -m physics.batch shots.jsonl -o outcomes.jsonl
+
+Each shot may contain:
+    aim: angle in degrees (0 is to the right, 90 is down) or an [x, y] direction
+    power: 1 to 100, like PoolGameState.power
+    balls: [[x, y], ...] starting positions, cue ball first, defaults to the standard rack
+    masses: mass per ball, defaults to the standard rack masses
+    cue: [x, y] overrides the cue ball position
+    id: copied to the outcome, defaults to the line number
+"""
+import argparse
+import json
+import math
+import sys
+
+from physics.simulation import simulate_shot
+from physics.table import CUE_MASS, STEP_RATE, Table, racked_table, standard_table
+
+
+def parse_aim(aim) -> tuple:
+    if isinstance(aim, (int, float)):
+        a = math.radians(aim)
+        return (math.cos(a), math.sin(a))
+    length = math.hypot(aim[0], aim[1])
+    return (aim[0] / length, aim[1] / length)
+
+
+def build_table(shot: dict) -> Table:
+    if "balls" in shot:
+        table = standard_table()
+        masses = shot.get("masses") or [CUE_MASS] + [1] * (len(shot["balls"]) - 1)
+        for position, mass in zip(shot["balls"], masses):
+            table.add_ball(position, mass)
+    else:
+        table = racked_table()
+    if "cue" in shot:
+        table.cue_ball().position[:] = shot["cue"]
+    return table
+
+
+def run_shot(shot: dict, delta, max_steps, broadphase=False, sleeping=False) -> dict:
+    table = build_table(shot)
+    return simulate_shot(table, parse_aim(shot["aim"]), shot.get("power", 1), delta, max_steps, broadphase, sleeping)
+
+
+def run(lines, out, delta=1 / STEP_RATE, max_steps=100000, broadphase=False, sleeping=False) -> int:
+    """
+    Simulate every shot in lines, writing each outcome as soon as it is done.
+    Returns the number of shots simulated.
+    """
+    count = 0
+    for number, line in enumerate(lines):
+        line = line.strip()
+        if not line:
+            continue
+        shot = json.loads(line)
+        outcome = {"id": shot.get("id", number)}
+        outcome.update(run_shot(shot, delta, max_steps, broadphase, sleeping))
+        out.write(json.dumps(outcome) + "\n")
+        count += 1
+    return count
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Simulate pool shots without rendering")
+    parser.add_argument("input", nargs="?", default="-", help="JSON lines file of shots, - for stdin")
+    parser.add_argument("-o", "--output", default="-", help="JSON lines file for the outcomes, - for stdout")
+    parser.add_argument("--rate", type=float, default=STEP_RATE, help="physics steps per second")
+    parser.add_argument("--max-steps", type=int, default=100000, help="give up on a shot after this many steps")
+    parser.add_argument("--broadphase", action="store_true", help="use the spatial hash for ball pairs")
+    parser.add_argument("--sleeping", action="store_true", help="skip resting balls")
+    args = parser.parse_args(argv)
+
+    lines = sys.stdin if args.input == "-" else open(args.input)
+    out = sys.stdout if args.output == "-" else open(args.output, "w")
+    try:
+        run(lines, out, 1 / args.rate, args.max_steps, args.broadphase, args.sleeping)
+    finally:
+        if lines is not sys.stdin:
+            lines.close()
+        if out is not sys.stdout:
+            out.close()
+
+
+if __name__ == "__main__":
+    main()
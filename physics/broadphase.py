@@ -0,0 +1,72 @@
+from math import floor
+
+# Half of the 3x3 neighbourhood, so each pair of neighbouring cells is only visited once
+NEIGHBOURS = ((1, 0), (1, 1), (0, 1), (-1, 1))
+
+
+class SpatialHash:
+    """
+    Uniform grid broadphase.
+    With cell_size at least the contact distance (two radii), any two circles that can
+    touch are in the same or neighbouring cells.
+    """
+    def __init__(self, cell_size: float) -> None:
+        self.cell_size = cell_size
+        self.cells: dict[tuple, list[int]] = {}
+
+    def rebuild(self, positions):
+        """
+        Re-bucket every position, indices into positions are what pairs() yields
+        """
+        self.cells.clear()
+        size = self.cell_size
+        for i, pos in enumerate(positions):
+            key = (floor(pos[0] / size), floor(pos[1] / size))
+            cell = self.cells.get(key)
+            if cell is None:
+                self.cells[key] = [i]
+            else:
+                cell.append(i)
+
+    def pairs(self):
+        """
+        Yield candidate pairs (i, j) with i < j, each pair exactly once
+        """
+        cells = self.cells
+        for (cx, cy), cell in cells.items():
+            for a in range(len(cell)):
+                for b in range(a + 1, len(cell)):
+                    i, j = cell[a], cell[b]
+                    yield (i, j) if i < j else (j, i)
+            for dx, dy in NEIGHBOURS:
+                other = cells.get((cx + dx, cy + dy))
+                if other is None:
+                    continue
+                for i in cell:
+                    for j in other:
+                        yield (i, j) if i < j else (j, i)
+
+    def key(self, pos) -> tuple:
+        return (floor(pos[0] / self.cell_size), floor(pos[1] / self.cell_size))
+
+    def insert(self, item, pos):
+        self.cells.setdefault(self.key(pos), []).append(item)
+
+    def remove(self, item, pos):
+        key = self.key(pos)
+        cell = self.cells[key]
+        cell.remove(item)
+        if not cell:
+            del self.cells[key]
+
+    def query(self, low, high):
+        """
+        Yield every item in the cells overlapping the box from low to high
+        """
+        x0, y0 = self.key(low)
+        x1, y1 = self.key(high)
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                cell = self.cells.get((cx, cy))
+                if cell is not None:
+                    yield from cell
@@ -0,0 +1,122 @@
+import heapq
+from math import sqrt
+
+
+def circle_circle_toi(pos1, vel1, pos2, vel2, distance: float) -> float or None:
+    """
+    Closed form time of impact for two circles moving at constant velocity.
+    Solves |(pos1 - pos2) + (vel1 - vel2) * t| = distance for the earliest root,
+    where distance is the sum of both radii.
+    The result is negative if the circles were already touching before t = 0,
+    and None if their centres never get exactly distance apart.
+    """
+    dx = pos1[0] - pos2[0]
+    dy = pos1[1] - pos2[1]
+    dvx = vel1[0] - vel2[0]
+    dvy = vel1[1] - vel2[1]
+
+    a = dvx * dvx + dvy * dvy
+    if a == 0:
+        return None
+    b = dx * dvx + dy * dvy
+    c = dx * dx + dy * dy - distance * distance
+    disc = b * b - a * c
+    if disc < 0:
+        return None
+    return (-b - sqrt(disc)) / a
+
+
+def circle_cushion_toi(pos, vel, radius: float, cushion: tuple) -> float or None:
+    """
+    Closed form time at which a circle touches an axis aligned cushion.
+    cushion: (axis, coordinate, direction, low, high)
+        axis: 0 for a vertical cushion, 1 for a horizontal one
+        coordinate: position of the cushion face along axis
+        direction: 1 if the playing surface is on the positive side of the face, else -1
+        low, high: extent of the face along the other axis
+    Returns None if the circle is not moving towards the face or is outside its extent.
+    The result is negative if the circle has already passed the face.
+    """
+    axis, coordinate, direction, low, high = cushion
+    other = 1 - axis
+    if pos[other] < low or pos[other] > high:
+        return None
+    speed = vel[axis] * direction
+    if speed >= 0:
+        return None
+    contact = coordinate + direction * radius
+    return (contact - pos[axis]) / vel[axis]
+
+
+def resolve_contacts(positions, velocities, masses, pairs, radius: float, restitution=1.0, iterations=16, tolerance=1e-9) -> int:
+    """
+    Resolve touching balls one collision at a time, in place.
+    positions, velocities: [x, y] lists per ball, masses: per ball
+    pairs: (i, j) indices of balls that touch or are about to
+    The contact approaching fastest is resolved first with a full collision, then the
+    contacts of both its balls are looked at again, so momentum travels down a line of
+    touching balls the way it does pair by pair. Ties go to the contact further up and left,
+    so the result doesn't depend on the order of the balls. At most iterations
+    collisions per contact are resolved. Any overlap left is split evenly between both balls.
+    Returns the number of contacts.
+    """
+    contacts = []
+    touching = {}
+    for i, j in pairs:
+        p1, p2 = positions[i], positions[j]
+        dx = p1[0] - p2[0]
+        dy = p1[1] - p2[1]
+        dist = sqrt(dx * dx + dy * dy)
+        if dist == 0:
+            # Coincident centres have no contact normal, push them apart along x
+            dx, dy, dist = 1, 0, 1
+        inv_i = 1 / masses[i]
+        inv_j = 1 / masses[j]
+        # Midpoint, the tie break
+        mx = (p1[0] + p2[0]) / 2
+        my = (p1[1] + p2[1]) / 2
+        touching.setdefault(i, []).append(len(contacts))
+        touching.setdefault(j, []).append(len(contacts))
+        contacts.append((i, j, dx / dist, dy / dist, dist, inv_i, inv_j, (1 + restitution) / (inv_i + inv_j), my, mx))
+
+    def approach(k):
+        i, j, nx, ny = contacts[k][:4]
+        v1, v2 = velocities[i], velocities[j]
+        return (v1[0] - v2[0]) * nx + (v1[1] - v2[1]) * ny
+
+    queue = []
+    for k, contact in enumerate(contacts):
+        speed = approach(k)
+        if speed < -tolerance:
+            queue.append((speed, contact[8], contact[9], k))
+    heapq.heapify(queue)
+
+    budget = iterations * len(contacts)
+    while queue and budget:
+        speed, _, _, k = heapq.heappop(queue)
+        if approach(k) != speed:
+            # Superseded by a later entry for the same contact
+            continue
+        budget -= 1
+        i, j, nx, ny, _, inv_i, inv_j, scale = contacts[k][:8]
+        impulse = -speed * scale
+        v1, v2 = velocities[i], velocities[j]
+        v1[0] += impulse * inv_i * nx
+        v1[1] += impulse * inv_i * ny
+        v2[0] -= impulse * inv_j * nx
+        v2[1] -= impulse * inv_j * ny
+        for c in touching[i] + touching[j]:
+            speed = approach(c)
+            if speed < -tolerance:
+                heapq.heappush(queue, (speed, contacts[c][8], contacts[c][9], c))
+
+    for i, j, nx, ny, dist, *_ in contacts:
+        # Split any remaining overlap evenly between both balls
+        push = (2 * radius - dist) / 2
+        if push > 0:
+            p1, p2 = positions[i], positions[j]
+            p1[0] += nx * push
+            p1[1] += ny * push
+            p2[0] -= nx * push
+            p2[1] -= ny * push
+    return len(contacts)
@@ -0,0 +1,43 @@
+import numpy as np
+
+from physics.collision import resolve_contacts
+
+
+def contact_pairs(positions, velocities, radius, delta, candidates=None):
+    """
+    Pairs (i, j), i < j, that touch now or will touch after moving for delta.
+    candidates: optional (i, j) index arrays to test instead of every pair
+    """
+    n = len(positions)
+    if candidates is None:
+        i, j = np.triu_indices(n, 1)
+    else:
+        i, j = candidates
+    future = positions + velocities * delta
+    offset = future[i] - future[j]
+    touching = np.einsum("ij,ij->i", offset, offset) <= (2 * radius) ** 2
+    offset = positions[i] - positions[j]
+    touching |= np.einsum("ij,ij->i", offset, offset) <= (2 * radius) ** 2
+    i, j = i[touching], j[touching]
+    # Sorted so the result never depends on the order the pairs were found in
+    order = np.lexsort((j, i))
+    return i[order], j[order]
+
+
+def solve_contacts(positions, velocities, masses, radius, delta, candidates=None, restitution=1.0, iterations=16) -> int:
+    """
+    Resolve every contact of the step, in place, with collision.resolve_contacts.
+    Only the balls in contact leave the arrays. Returns the number of contacts.
+    """
+    i, j = contact_pairs(positions, velocities, radius, delta, candidates)
+    if len(i) == 0:
+        return 0
+
+    members = np.unique(np.concatenate((i, j)))
+    group_positions = positions[members].tolist()
+    group_velocities = velocities[members].tolist()
+    pairs = zip(np.searchsorted(members, i).tolist(), np.searchsorted(members, j).tolist())
+    count = resolve_contacts(group_positions, group_velocities, masses[members].tolist(), pairs, radius, restitution, iterations)
+    positions[members] = group_positions
+    velocities[members] = group_velocities
+    return count
@@ -0,0 +1,276 @@
+import heapq
+from math import exp, log, sqrt
+
+from physics.collision import circle_circle_toi, circle_cushion_toi
+from physics.table import STEP_RATE
+
+
+def friction_decay(friction: float, mass: float, step_rate: float) -> float:
+    """
+    Continuous decay rate (1/s) matching a per step friction force of -friction * velocity
+    applied step_rate times a second
+    """
+    return -log(1 - friction / mass) * step_rate
+
+
+class EventSimulator:
+    """
+    Event driven shot resolution.
+    Balls slow down as v(t) = v0 * e^(-decay * t), so in terms of
+    s(t) = (1 - e^(-decay * t)) / decay every ball moves in a straight line at a
+    constant "undecayed" velocity between events. Collisions are predicted in s,
+    kept in a priority queue, and the simulation jumps from one event to the next.
+    bounds: (left, top, right, bottom) of the playing surface inside the cushions
+    """
+    BALL = 0
+    CUSHION = 1
+    POCKET = 2
+    STOP = 3
+    # Slowest approach speed along the contact normal that still counts as a collision,
+    # stops rounding errors from chaining endless zero time contacts in a resting cluster
+    APPROACH_TOLERANCE = 1e-6
+
+    def __init__(self, radius: float, decay: float, bounds: tuple, holes=(), hole_radius: float = 0, stop_speed: float = sqrt(0.05)) -> None:
+        self.radius = radius
+        self.decay = decay
+        self.holes = [tuple(hole) for hole in holes]
+        self.hole_radius = hole_radius
+        self.stop_speed = stop_speed
+
+        left, top, right, bottom = bounds
+        self.cushions = [
+            (1, top, 1, left, right),
+            (1, bottom, -1, left, right),
+            (0, left, 1, top, bottom),
+            (0, right, -1, top, bottom),
+        ]
+
+        # Per ball state, position is origins[i] + velocities[i] * (s - s_origins[i])
+        self.origins: list[list] = []
+        self.s_origins: list[float] = []
+        self.velocities: list[list] = []
+        self.masses: list[float] = []
+        self.counts: list[int] = []
+        self.active: list[bool] = []
+
+        self.s = 0
+        self.queue = []
+        self.sequence = 0
+        self.events = 0
+        self.sunk: list[int] = []
+        self.started = False
+
+    def add_ball(self, position, velocity=(0, 0), mass=1.0) -> int:
+        self.origins.append([position[0], position[1]])
+        self.s_origins.append(self.s)
+        # velocity is the real velocity now, scale it back to s space
+        scale = 1 - self.decay * self.s
+        self.velocities.append([velocity[0] / scale, velocity[1] / scale])
+        self.masses.append(mass)
+        self.counts.append(0)
+        self.active.append(True)
+        return len(self.masses) - 1
+
+    @property
+    def time(self) -> float:
+        return -log(1 - self.decay * self.s) / self.decay
+
+    def s_at(self, time: float) -> float:
+        return (1 - exp(-self.decay * time)) / self.decay
+
+    def position(self, i: int) -> tuple:
+        ds = self.s - self.s_origins[i]
+        return (self.origins[i][0] + self.velocities[i][0] * ds, self.origins[i][1] + self.velocities[i][1] * ds)
+
+    def velocity(self, i: int) -> tuple:
+        scale = 1 - self.decay * self.s
+        return (self.velocities[i][0] * scale, self.velocities[i][1] * scale)
+
+    def is_moving(self) -> bool:
+        """
+        False once every ball has stopped or been pocketed
+        """
+        if not self.started:
+            self.start()
+        return len(self.queue) > 0
+
+    def start(self):
+        self.started = True
+        for i in range(len(self.masses)):
+            self.predict(i)
+
+    def advance(self, delta: float):
+        """
+        Process every event within the next delta seconds, then move the clock forward
+        """
+        target = self.time + delta
+        if self.decay * self.s_at(target) >= 1:
+            target_s = 1 / self.decay
+        else:
+            target_s = self.s_at(target)
+        self.process_until(target_s)
+        if self.queue:
+            self.s = target_s
+
+    def run(self, max_events: int = 100000) -> int:
+        """
+        Resolve the shot until every ball is at rest, returns the number of events processed
+        """
+        self.process_until(float("inf"), max_events)
+        return self.events
+
+    def process_until(self, target_s: float, max_events: int = None):
+        if not self.started:
+            self.start()
+        while self.queue and self.queue[0][0] <= target_s:
+            if max_events is not None and self.events >= max_events:
+                break
+            s, _, kind, i, j, count_i, count_j = heapq.heappop(self.queue)
+            if self.counts[i] != count_i or (kind == EventSimulator.BALL and self.counts[j] != count_j):
+                continue
+            self.s = s
+            self.events += 1
+            if kind == EventSimulator.BALL:
+                self.collide_balls(i, j)
+                self.predict(i)
+                self.predict(j)
+            elif kind == EventSimulator.CUSHION:
+                self.collide_cushion(i, j)
+                self.predict(i)
+            elif kind == EventSimulator.POCKET:
+                self.pocket(i)
+            elif kind == EventSimulator.STOP:
+                self.move_origin(i)
+                self.velocities[i] = [0, 0]
+                self.counts[i] += 1
+                self.predict(i)
+
+    def push(self, s, kind, i, j=-1):
+        count_j = self.counts[j] if kind == EventSimulator.BALL else 0
+        heapq.heappush(self.queue, (s, self.sequence, kind, i, j, self.counts[i], count_j))
+        self.sequence += 1
+
+    def predict(self, i: int):
+        if not self.active[i]:
+            return
+        s_max = 1 / self.decay
+        pos = self.position(i)
+        vel = self.velocities[i]
+        moving = vel[0] != 0 or vel[1] != 0
+
+        for j in range(len(self.masses)):
+            if j == i or not self.active[j]:
+                continue
+            other_vel = self.velocities[j]
+            if not moving and other_vel[0] == 0 and other_vel[1] == 0:
+                continue
+            other = self.position(j)
+            ds = circle_circle_toi(pos, vel, other, other_vel, self.radius * 2)
+            if ds is None:
+                continue
+            # Only collide while approaching, this also covers balls that are already touching
+            approach = (pos[0] - other[0]) * (vel[0] - other_vel[0]) + (pos[1] - other[1]) * (vel[1] - other_vel[1])
+            if approach >= -EventSimulator.APPROACH_TOLERANCE * self.radius * 2:
+                continue
+            ds = max(ds, 0)
+            if self.s + ds < s_max:
+                self.push(self.s + ds, EventSimulator.BALL, i, j)
+
+        if not moving:
+            return
+
+        for c, cushion in enumerate(self.cushions):
+            ds = circle_cushion_toi(pos, vel, self.radius, cushion)
+            if ds is not None and self.s + max(ds, 0) < s_max:
+                self.push(self.s + max(ds, 0), EventSimulator.CUSHION, i, c)
+
+        for h, hole in enumerate(self.holes):
+            ds = circle_circle_toi(pos, vel, hole, (0, 0), self.hole_radius - self.radius)
+            if ds is not None and self.s + max(ds, 0) < s_max:
+                # The exit root is in the past if the ball is leaving the pocket
+                if ds < 0 and (pos[0] - hole[0]) * vel[0] + (pos[1] - hole[1]) * vel[1] >= 0:
+                    continue
+                self.push(self.s + max(ds, 0), EventSimulator.POCKET, i, h)
+
+        speed = sqrt(vel[0] * vel[0] + vel[1] * vel[1])
+        stop = (1 - self.stop_speed / speed) / self.decay
+        self.push(max(stop, self.s), EventSimulator.STOP, i)
+
+    def move_origin(self, i: int):
+        self.origins[i] = list(self.position(i))
+        self.s_origins[i] = self.s
+
+    def collide_balls(self, i: int, j: int):
+        self.move_origin(i)
+        self.move_origin(j)
+        self.counts[i] += 1
+        self.counts[j] += 1
+
+        pi, pj = self.origins[i], self.origins[j]
+        nx = pi[0] - pj[0]
+        ny = pi[1] - pj[1]
+        dist = sqrt(nx * nx + ny * ny)
+        if dist == 0:
+            return
+        nx /= dist
+        ny /= dist
+
+        vi, vj = self.velocities[i], self.velocities[j]
+        relative = (vi[0] - vj[0]) * nx + (vi[1] - vj[1]) * ny
+        if relative >= -EventSimulator.APPROACH_TOLERANCE:
+            return
+        mi, mj = self.masses[i], self.masses[j]
+        impulse = 2 * relative / (mi + mj)
+        self.velocities[i] = [vi[0] - impulse * mj * nx, vi[1] - impulse * mj * ny]
+        self.velocities[j] = [vj[0] + impulse * mi * nx, vj[1] + impulse * mi * ny]
+
+    def collide_cushion(self, i: int, c: int):
+        self.move_origin(i)
+        self.counts[i] += 1
+        axis, coordinate, direction = self.cushions[c][:3]
+        self.origins[i][axis] = coordinate + direction * self.radius
+        self.velocities[i][axis] *= -1
+
+    def pocket(self, i: int):
+        self.move_origin(i)
+        self.velocities[i] = [0, 0]
+        self.counts[i] += 1
+        self.active[i] = False
+        self.sunk.append(i)
+
+
+def shot_simulator(table, cue_force=None) -> EventSimulator:
+    """
+    Event driven simulator for a Table, optionally with a force applied to the cue ball.
+    Indices in the simulator match table.balls. Every ball shares the friction decay of a unit mass ball.
+    """
+    decay = friction_decay(table.friction, 1, STEP_RATE)
+    sim = EventSimulator(table.radius, decay, table.bounds, table.holes, table.hole_radius)
+    for i, ball in enumerate(table.balls):
+        vx, vy = ball.velocity
+        if i == 0 and cue_force is not None:
+            vx += cue_force[0] / ball.mass
+            vy += cue_force[1] / ball.mass
+        sim.add_ball(ball.position, (vx, vy), ball.mass)
+    return sim
+
+
+def simulate_shot(table, cue_force, delta=1 / STEP_RATE, max_steps=100000) -> dict:
+    """
+    Play a shot event driven, advancing delta at a time the way PoolGameState plays it back.
+    Same result as simulation.simulate_shot, table is not modified
+    """
+    sim = shot_simulator(table, cue_force)
+    steps = 0
+    while steps < max_steps:
+        sim.advance(delta)
+        steps += 1
+        if not sim.is_moving():
+            break
+    pocketed = sorted(sim.sunk)
+    return {
+        "positions": [None if i in pocketed else list(sim.position(i)) for i in range(len(table.balls))],
+        "pocketed": pocketed,
+        "scratch": 0 in pocketed,
+        "steps": steps,
+    }
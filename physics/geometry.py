@@ -0,0 +1,308 @@
+"""
+Cushion and pocket geometry, check that the jaws deflect balls with
+    python -m physics.geometry
+"""
+import sys
+from math import atan2, cos, pi, sin, sqrt
+
+from physics.collision import circle_circle_toi
+from physics.table import BallState, Table, standard_table
+
+
+class Segment:
+    """
+    Straight cushion face from a to b, balls bounce off either side
+    """
+    def __init__(self, a, b) -> None:
+        self.a = (float(a[0]), float(a[1]))
+        self.b = (float(b[0]), float(b[1]))
+        self.box = (min(a[0], b[0]), min(a[1], b[1]), max(a[0], b[0]), max(a[1], b[1]))
+
+    def __repr__(self) -> str:
+        return f"Segment({self.a}, {self.b})"
+
+    def toi(self, pos, vel, radius) -> tuple or None:
+        """
+        (time, normal) of the first contact of a moving circle, None if it misses
+        """
+        ax, ay = self.a
+        dx = self.b[0] - ax
+        dy = self.b[1] - ay
+        length = sqrt(dx * dx + dy * dy)
+        best = None
+        if length > 0:
+            nx, ny = -dy / length, dx / length
+            distance = (pos[0] - ax) * nx + (pos[1] - ay) * ny
+            # Use the side of the face the circle is on
+            if distance < 0:
+                nx, ny, distance = -nx, -ny, -distance
+            speed = vel[0] * nx + vel[1] * ny
+            if speed < 0:
+                t = (distance - radius) / -speed
+                # Where the circle meets the line, must be on the segment
+                cx = pos[0] + vel[0] * t - ax
+                cy = pos[1] + vel[1] * t - ay
+                along = (cx * dx + cy * dy) / length
+                if 0 <= along <= length:
+                    best = (t, (nx, ny))
+
+        # Rounded ends
+        for end in (self.a, self.b):
+            t = circle_circle_toi(pos, vel, end, (0, 0), radius)
+            if t is None or (best is not None and t >= best[0]):
+                continue
+            cx = pos[0] + vel[0] * t - end[0]
+            cy = pos[1] + vel[1] * t - end[1]
+            if cx * vel[0] + cy * vel[1] >= 0:
+                continue
+            d = sqrt(cx * cx + cy * cy) or 1
+            best = (t, (cx / d, cy / d))
+        return best
+
+
+class Arc:
+    """
+    Convex rounded cushion nose, the part of a circle between two angles (radians, counter clockwise from start)
+    """
+    def __init__(self, center, radius, start, end) -> None:
+        self.center = (float(center[0]), float(center[1]))
+        self.radius = radius
+        self.start = start % (2 * pi)
+        # A sweep of a whole turn or more is the full circle, not an empty arc
+        self.span = 2 * pi if end - start >= 2 * pi else (end - start) % (2 * pi)
+        cx, cy = self.center
+        self.box = (cx - radius, cy - radius, cx + radius, cy + radius)
+
+    def __repr__(self) -> str:
+        return f"Arc({self.center}, {self.radius}, {self.start}, {self.start + self.span})"
+
+    def contains_angle(self, angle) -> bool:
+        return (angle - self.start) % (2 * pi) <= self.span
+
+    def toi(self, pos, vel, radius) -> tuple or None:
+        t = circle_circle_toi(pos, vel, self.center, (0, 0), self.radius + radius)
+        if t is None:
+            return None
+        cx = pos[0] + vel[0] * t - self.center[0]
+        cy = pos[1] + vel[1] * t - self.center[1]
+        if cx * vel[0] + cy * vel[1] >= 0 or not self.contains_angle(atan2(cy, cx)):
+            return None
+        d = sqrt(cx * cx + cy * cy) or 1
+        return (t, (cx / d, cy / d))
+
+
+class Pocket:
+    def __init__(self, center, radius) -> None:
+        self.center = (float(center[0]), float(center[1]))
+        self.radius = radius
+        cx, cy = self.center
+        self.box = (cx - radius, cy - radius, cx + radius, cy + radius)
+
+    def __repr__(self) -> str:
+        return f"Pocket({self.center}, {self.radius})"
+
+    def captures(self, pos, radius) -> bool:
+        dx = pos[0] - self.center[0]
+        dy = pos[1] - self.center[1]
+        return self.radius > sqrt(dx * dx + dy * dy) + radius
+
+
+def overlaps(a, b) -> bool:
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+class BVH:
+    """
+    Bounding volume hierarchy over anything with a box = (min x, min y, max x, max y)
+    """
+    LEAF_SIZE = 2
+
+    def __init__(self, items: list) -> None:
+        self.items = None
+        self.left = None
+        self.right = None
+        self.box = (
+            min(item.box[0] for item in items), min(item.box[1] for item in items),
+            max(item.box[2] for item in items), max(item.box[3] for item in items),
+        )
+        if len(items) <= BVH.LEAF_SIZE:
+            self.items = items
+            return
+
+        # Split at the median centre along the longest side
+        axis = 0 if self.box[2] - self.box[0] >= self.box[3] - self.box[1] else 1
+        items = sorted(items, key=lambda item: item.box[axis] + item.box[axis + 2])
+        half = len(items) // 2
+        self.left = BVH(items[:half])
+        self.right = BVH(items[half:])
+
+    def query(self, box):
+        """
+        Yield every item whose box overlaps box
+        """
+        stack = [self]
+        while stack:
+            node = stack.pop()
+            if not overlaps(node.box, box):
+                continue
+            if node.items is not None:
+                for item in node.items:
+                    if overlaps(item.box, box):
+                        yield item
+            else:
+                stack.append(node.left)
+                stack.append(node.right)
+
+
+class TableGeometry:
+    """
+    Cushions, jaws and pockets of a table as segments, arcs and circles,
+    with a BVH so each ball only tests the features near its path
+    """
+    def __init__(self, features: list, pockets: list[Pocket], radius) -> None:
+        self.features = features
+        self.pockets = pockets
+        self.radius = radius
+        self.feature_tree = BVH(features) if features else None
+        self.pocket_tree = BVH(pockets) if pockets else None
+
+    def __repr__(self) -> str:
+        # Describes the shape only, e.g. for ShotCache keys
+        return f"TableGeometry({self.features}, {self.pockets}, {self.radius})"
+
+    def swept_box(self, start, end) -> tuple:
+        r = self.radius
+        return (min(start[0], end[0]) - r, min(start[1], end[1]) - r, max(start[0], end[0]) + r, max(start[1], end[1]) + r)
+
+    def first_hit(self, pos, vel, delta) -> tuple or None:
+        """
+        Earliest (time, normal) a ball hits a cushion feature within delta
+        """
+        if self.feature_tree is None:
+            return None
+        end = (pos[0] + vel[0] * delta, pos[1] + vel[1] * delta)
+        best = None
+        for feature in self.feature_tree.query(self.swept_box(pos, end)):
+            hit = feature.toi(pos, vel, self.radius)
+            if hit is not None and hit[0] <= delta and (best is None or hit[0] < best[0]):
+                best = hit
+        return best
+
+    def collide(self, ball, delta):
+        """
+        Bounce ball off the first feature it would hit next frame
+        """
+        hit = self.first_hit(ball.position, ball.velocity, delta)
+        if hit is None:
+            return
+        t, (nx, ny) = hit
+        t = max(t, 0)
+        v = ball.velocity
+        ball.position[0] += v[0] * t
+        ball.position[1] += v[1] * t
+        speed = v[0] * nx + v[1] * ny
+        v[0] -= 2 * speed * nx
+        v[1] -= 2 * speed * ny
+
+    def pocket_at(self, pos) -> Pocket or None:
+        if self.pocket_tree is None:
+            return None
+        for pocket in self.pocket_tree.query((pos[0], pos[1], pos[0], pos[1])):
+            if pocket.captures(pos, self.radius):
+                return pocket
+        return None
+
+
+def from_table(table: Table, jaw_radius: float = None, arc_segments: int = 0) -> TableGeometry:
+    """
+    Geometry of a Table. Without jaw_radius the cushion faces are the four straight
+    faces of table.cushions. With it every face is cut where it passes a pocket and the
+    cut ends get rounded jaws of that radius; arc_segments > 0 approximates each jaw
+    with that many segments instead of an arc.
+    """
+    pockets = [Pocket(hole, table.hole_radius) for hole in table.holes]
+    features = []
+    for axis, coordinate, direction, low, high in table.cushions:
+        other = 1 - axis
+        cuts = []
+        if jaw_radius is not None:
+            for hole in table.holes:
+                # Pockets whose mouth crosses this face
+                if abs(hole[axis] - coordinate) < table.hole_radius:
+                    half = sqrt(table.hole_radius ** 2 - (hole[axis] - coordinate) ** 2)
+                    cuts.append((hole[other] - half, hole[other] + half))
+        cuts.sort()
+
+        start = low
+        spans = []
+        for cut_low, cut_high in cuts:
+            if cut_low > start:
+                spans.append((start, cut_low))
+            start = max(start, cut_high)
+        if start < high:
+            spans.append((start, high))
+
+        for span_low, span_high in spans:
+            a = [0, 0]
+            b = [0, 0]
+            a[axis] = b[axis] = coordinate
+            a[other], b[other] = span_low, span_high
+            features.append(Segment(a, b))
+            for end, cut in ((span_low, span_low > low), (span_high, span_high < high)):
+                if cut:
+                    centre = [0, 0]
+                    centre[axis] = coordinate - direction * jaw_radius
+                    centre[other] = end
+                    features.extend(jaw(centre, jaw_radius, arc_segments))
+
+        # Close each mouth behind the jaws so balls that miss the pocket rattle back out
+        for cut_low, cut_high in cuts:
+            a = [0, 0]
+            b = [0, 0]
+            a[axis] = b[axis] = coordinate - direction * 2 * jaw_radius
+            a[other], b[other] = max(cut_low, low), min(cut_high, high)
+            if a[other] < b[other]:
+                features.append(Segment(a, b))
+    return TableGeometry(features, pockets, table.radius)
+
+
+def jaw(centre, radius, segments) -> list:
+    if segments <= 0:
+        return [Arc(centre, radius, 0, 2 * pi)]
+    points = [
+        (centre[0] + radius * cos(2 * pi * k / segments), centre[1] + radius * sin(2 * pi * k / segments))
+        for k in range(segments + 1)
+    ]
+    return [Segment(points[k], points[k + 1]) for k in range(segments)]
+
+
+def check_jaws(jaw_radii=(3, 5, 8)) -> int:
+    """
+    Roll a ball straight at every jaw of a standard table from each side, for each jaw radius.
+    Raises AssertionError if one doesn't bounce back, returns how many bounced
+    """
+    table = standard_table()
+    bounced = 0
+    for jaw_radius in jaw_radii:
+        jaws = [feature for feature in from_table(table, jaw_radius).features if isinstance(feature, Arc)]
+        assert jaws, f"no jaws of radius {jaw_radius}"
+        for arc in jaws:
+            # The arc on its own, so the cushion faces around it can't deflect the ball first
+            geometry = TableGeometry([arc], [], table.radius)
+            gap = jaw_radius + table.radius + 1
+            for k in range(8):
+                dx, dy = cos(k * pi / 4), sin(k * pi / 4)
+                ball = BallState((arc.center[0] + dx * gap, arc.center[1] + dy * gap), velocity=(-dx * 10, -dy * 10))
+                geometry.collide(ball, 1)
+                v = ball.velocity
+                assert v[0] * dx + v[1] * dy > 0, f"ball went through a jaw of radius {jaw_radius} at {arc.center}"
+                bounced += 1
+    return bounced
+
+
+def main():
+    sys.stdout.write(f"{check_jaws()} shots at jaws bounced off\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+import numpy as np
+
+from physics.table import OFF_TABLE, Table
+from physics.vector_engine import collide_balls, collide_walls, in_holes, integrate
+
+
+class MultiTablePhysics:
+    """
+    Steps many independent tables at once with the batched kernels of VectorPhysics,
+    one row of the leading array dimension per table.
+    Every table shares the geometry of the first one. Tables with fewer balls are
+    padded with dead slots, and tables where nothing moves are skipped until a
+    force is applied to them again.
+    """
+    def __init__(self, tables: list[Table]) -> None:
+        first = tables[0]
+        self.radius = first.radius
+        self.friction = first.friction
+        self.bounds = first.bounds
+        self.holes = np.array(first.holes, dtype=np.float64).reshape(-1, 2)
+        self.hole_radius = first.hole_radius
+
+        count = len(tables)
+        size = max(len(table.balls) for table in tables)
+        self.positions = np.zeros((count, size, 2), dtype=np.float64)
+        self.velocities = np.zeros((count, size, 2), dtype=np.float64)
+        self.forces = np.zeros((count, size, 2), dtype=np.float64)
+        # Dead slots get unit mass so the division in step stays finite
+        self.masses = np.ones((count, size), dtype=np.float64)
+        self.alive = np.zeros((count, size), dtype=bool)
+        self.pocketed = np.zeros((count, size), dtype=bool)
+        self.scratched = np.zeros(count, dtype=bool)
+        self.steps = np.zeros(count, dtype=np.int64)
+
+        for t, table in enumerate(tables):
+            n = len(table.balls)
+            self.positions[t, :n] = [ball.position for ball in table.balls]
+            self.velocities[t, :n] = [ball.velocity for ball in table.balls]
+            self.forces[t, :n] = [ball.force for ball in table.balls]
+            self.masses[t, :n] = [ball.mass for ball in table.balls]
+            self.alive[t, :n] = True
+            self.scratched[t] = table.scratched
+        self.active = self.moving_tables()
+
+    def __len__(self) -> int:
+        return len(self.positions)
+
+    def apply_force(self, table: int, ball: int, force):
+        self.forces[table, ball] += force
+        self.active[table] = True
+
+    def moving_tables(self, index=slice(None)) -> np.ndarray:
+        v = self.velocities[index]
+        moving = np.einsum("tnk,tnk->tn", v, v) > 0.05
+        pending = (self.forces[index] != 0).any(axis=2)
+        return ((moving | pending) & self.alive[index]).any(axis=1)
+
+    def step(self, delta):
+        """
+        Advance every active table by delta seconds
+        """
+        index = np.flatnonzero(self.active)
+        if len(index) == 0:
+            return
+        p = self.positions[index]
+        v = self.velocities[index]
+        f = self.forces[index]
+        masses = self.masses[index]
+        alive = self.alive[index]
+
+        integrate(p, v, f, masses, self.friction, delta, alive)
+        collide_walls(p, v, self.bounds, self.radius, delta, alive)
+        collide_balls(p, v, masses, self.radius, delta, alive)
+
+        self.positions[index] = p
+        self.velocities[index] = v
+        self.forces[index] = f
+        self.sink(index)
+        self.steps[index] += 1
+        self.active[index] = self.moving_tables(index)
+
+    def sink(self, index):
+        if len(self.holes) == 0:
+            return
+        sunk = in_holes(self.positions[index], self.holes, self.radius, self.hole_radius) & self.alive[index]
+        if not sunk.any():
+            return
+
+        # The cue ball is parked off the table, everything else leaves the table
+        cue = index[sunk[:, 0]]
+        self.scratched[cue] = True
+        self.positions[cue, 0] = OFF_TABLE
+        self.velocities[cue, 0] = 0
+        sunk[:, 0] = False
+
+        t, i = np.nonzero(sunk)
+        self.alive[index[t], i] = False
+        self.pocketed[index[t], i] = True
+        self.velocities[index[t], i] = 0
+
+    def run(self, delta, max_steps=100000) -> int:
+        """
+        Step until every table is at rest, returns the number of batched steps
+        """
+        steps = 0
+        while self.active.any() and steps < max_steps:
+            self.step(delta)
+            steps += 1
+        return steps
+
+    def result(self, table: int, count: int = None) -> dict:
+        """
+        Outcome of one table in the same format as simulate_shot,
+        count is the number of balls the table started with
+        """
+        if count is None:
+            count = self.positions.shape[1]
+        pocketed = [int(i) for i in np.flatnonzero(self.pocketed[table, :count])]
+        if self.scratched[table]:
+            pocketed = [0] + pocketed
+        return {
+            "positions": [
+                None if i in pocketed else self.positions[table, i].tolist()
+                for i in range(count)
+            ],
+            "pocketed": pocketed,
+            "scratch": bool(self.scratched[table]),
+            "steps": int(self.steps[table]),
+        }
+
+    def write_back(self, t: int, table: Table):
+        """
+        Copy the state of table t into a Table built with the same balls in the same order
+        """
+        balls = list(table.balls)
+        for i, ball in enumerate(balls):
+            ball.position[:] = self.positions[t, i].tolist()
+            ball.velocity[:] = self.velocities[t, i].tolist()
+            ball.force[:] = self.forces[t, i].tolist()
+            if self.pocketed[t, i]:
+                table.balls.remove(ball)
+                table.pocketed.append(ball)
+        table.scratched = bool(self.scratched[t])
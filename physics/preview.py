@@ -0,0 +1,225 @@
+import math
+import time
+from collections import OrderedDict
+
+from physics.collision import circle_circle_toi
+from physics.simulation import Simulation, shot_force
+from physics.table import STEP_RATE, BallState, Table
+
+
+# Square of the smallest velocity change that counts as a hit. Leftover velocities of
+# resting balls are below is_moving's, a cushion or another resting ball can at most
+# reverse them, so their change stays under twice that speed for each
+HIT_CHANGE = (4 * math.sqrt(0.05)) ** 2
+
+
+def after_friction(ball: BallState, friction) -> tuple:
+    """
+    Velocity of a ball once the next step's friction and force are applied, see integrate
+    """
+    return tuple(v + (f - v * friction) / ball.mass for v, f in zip(ball.velocity, ball.force))
+
+
+class Trajectory:
+    """
+    Predicted outcome of one shot, filled in a few steps at a time.
+    paths: points each ball passes through, in the order of table.balls
+    contact: (ghost ball position, index of the ball hit, cue direction after, object direction after)
+    for the first ball the cue ball hits, directions are angles in radians
+    """
+    __slots__ = ("aim", "power", "paths", "contact", "steps", "done", "sim", "balls", "moving", "table", "make_simulation", "step_cost")
+
+    def __init__(self, table: Table, aim, power, make_simulation) -> None:
+        self.aim = aim
+        self.power = power
+        # Copied once work starts on the shot, see start
+        self.table = table
+        self.make_simulation = make_simulation
+        self.paths = [[tuple(table.cue_ball().position)]]
+        self.moving = None
+        self.contact = None
+        self.steps = 0
+        self.done = False
+        self.sim: Simulation = None
+        self.balls = None
+        # Seconds the latest step took
+        self.step_cost = 0
+
+    def start(self):
+        """
+        Set up the simulation of the shot on a copy of the table
+        """
+        table = self.table.copy()
+        self.table = None
+        self.balls = list(table.balls)
+        self.paths = [[tuple(ball.position)] for ball in self.balls]
+        self.moving = [False] * len(self.balls)
+        self.sim = self.make_simulation(table)
+        if self.sim.sleep is not None:
+            # Only the cue ball moves, the rest of the table joins the step when something reaches it
+            self.sim.sleep.settle()
+        self.sim.apply_force(table.cue_ball(), shot_force(table, self.aim, self.power))
+
+    def advance(self, delta, sample_every):
+        sim = self.sim
+        cue = self.balls[0]
+        resting = None
+        if self.contact is None:
+            # Balls at rest before the step, the first one whose velocity jumps was hit by the cue ball.
+            # Resting balls can keep a leftover velocity below is_moving, so compare against
+            # the velocity friction alone would leave them, see integrate
+            friction = sim.table.friction
+            resting = [
+                (i, tuple(ball.position), after_friction(ball, friction))
+                for i, ball in enumerate(self.balls) if i and not ball.is_moving()
+            ]
+            start = tuple(cue.position)
+            velocity = after_friction(cue, friction)
+        sim.step(delta)
+        self.steps += 1
+
+        if resting:
+            hit = []
+            for i, position, expected in resting:
+                v = self.balls[i].velocity
+                dvx = v[0] - expected[0]
+                dvy = v[1] - expected[1]
+                if dvx * dvx + dvy * dvy > HIT_CHANGE:
+                    hit.append((i, position))
+            if hit:
+                self.contact = self.first_contact(start, velocity, hit, delta)
+
+        for i, ball in enumerate(self.balls):
+            moving = ball.is_moving()
+            if moving or self.moving[i]:
+                # Sample moving balls, and always keep the point where one stops
+                if not moving or self.steps % sample_every == 0:
+                    self.paths[i].append(tuple(ball.position))
+            self.moving[i] = moving
+        if not sim.is_moving():
+            self.done = True
+
+    def first_contact(self, start, velocity, hit, delta) -> tuple:
+        """
+        Where the cue ball touched the first of the balls set moving this step,
+        and the directions both leave in
+        """
+        d = 2 * self.sim.table.radius
+        best = None
+        for i, position in hit:
+            t = circle_circle_toi(start, velocity, position, (0, 0), d)
+            # The step integrates, then collides up to a frame ahead, see Simulation.step.
+            # A root outside that is a miss on the straight path
+            if t is not None and 0 <= t <= 2 * delta and (best is None or t < best[0]):
+                best = (t, i, position)
+        if best is None:
+            # The cue ball bounced off a cushion first, fall back to where the ball went
+            i, position = hit[0]
+            v = self.balls[i].velocity
+            direction = math.atan2(v[1], v[0])
+            ghost = (position[0] - math.cos(direction) * d, position[1] - math.sin(direction) * d)
+            cue = self.balls[0].velocity
+            return (ghost, i, math.atan2(cue[1], cue[0]), direction)
+
+        t, i, position = best
+        ghost = (start[0] + velocity[0] * t, start[1] + velocity[1] * t)
+        nx = (position[0] - ghost[0]) / d
+        ny = (position[1] - ghost[1]) / d
+        # Elastic collision with a ball at rest, see collide_ball
+        m1 = self.balls[0].mass
+        m2 = self.balls[i].mass
+        vn = velocity[0] * nx + velocity[1] * ny
+        kept = vn * (m1 - m2) / (m1 + m2)
+        cue = (velocity[0] + (kept - vn) * nx, velocity[1] + (kept - vn) * ny)
+        return (ghost, i, math.atan2(cue[1], cue[0]), math.atan2(ny, nx))
+
+
+class TrajectoryPreview:
+    """
+    Predicts shots incrementally, at most budget seconds of simulation per call to work.
+    Setting a shot up counts against the budget, a step is only started if the budget can
+    pay for it, and a shot whose steps cost more than a whole budget stops being predicted.
+    Shots are bucketed by aim angle (degrees) and power, a shot in the same bucket as
+    a cached one reuses it, so a jittering mouse doesn't restart the prediction.
+    make_simulation: builds the Simulation for a copy of the table, defaults to Simulation(table)
+    max_steps: how far ahead to predict
+    """
+    def __init__(self, make_simulation=Simulation, angle_step=0.25, power_step=1, max_steps=300, sample_every=3, cache_size=64, delta=1 / STEP_RATE) -> None:
+        self.make_simulation = make_simulation
+        self.angle_step = angle_step
+        self.power_step = power_step
+        self.max_steps = max_steps
+        self.sample_every = sample_every
+        self.cache_size = cache_size
+        self.delta = delta
+        self.table: Table = None
+        self.cache: OrderedDict[tuple, Trajectory] = OrderedDict()
+        self.current: Trajectory = None
+        # Seconds the first step of the latest trajectory on this table took
+        self.first_step_cost = 0
+
+    def reset(self, table: Table):
+        """
+        Predict from table from now on, call whenever the balls have moved
+        """
+        self.table = table
+        self.cache.clear()
+        self.current = None
+        self.first_step_cost = 0
+
+    def key(self, aim, power) -> tuple:
+        angle = math.degrees(math.atan2(aim[1], aim[0]))
+        return (round(angle / self.angle_step), round(power / self.power_step))
+
+    def request(self, aim, power) -> Trajectory:
+        """
+        Trajectory for a shot, possibly still being worked on
+        """
+        key = self.key(aim, power)
+        trajectory = self.cache.get(key)
+        if trajectory is None:
+            angle = math.radians(key[0] * self.angle_step)
+            trajectory = Trajectory(self.table, (math.cos(angle), math.sin(angle)), key[1] * self.power_step, self.make_simulation)
+            self.cache[key] = trajectory
+            while len(self.cache) > self.cache_size:
+                self.cache.popitem(last=False)
+        self.cache.move_to_end(key)
+        self.current = trajectory
+        return trajectory
+
+    def work(self, budget: float) -> Trajectory:
+        """
+        Advance the latest requested trajectory for up to budget seconds, judging what
+        the next step costs by the one before it
+        """
+        trajectory = self.current
+        if trajectory is None:
+            return None
+        now = time.perf_counter()
+        end = now + budget
+        if trajectory.sim is None and not trajectory.done:
+            trajectory.start()
+            # Until it has stepped, expect the shot to start as the latest one on this table did
+            trajectory.step_cost = self.first_step_cost
+            now = time.perf_counter()
+        while not trajectory.done:
+            if trajectory.step_cost > budget:
+                # A step wouldn't fit in any frame's budget, keep the prediction so far
+                trajectory.done = True
+                break
+            # Don't start a step the rest of the budget can't pay for, the next frame can
+            if now + trajectory.step_cost > end:
+                break
+            trajectory.advance(self.delta, self.sample_every)
+            if trajectory.steps >= self.max_steps:
+                trajectory.done = True
+            stepped = time.perf_counter()
+            trajectory.step_cost = stepped - now
+            if trajectory.steps == 1:
+                self.first_step_cost = trajectory.step_cost
+            now = stepped
+        if trajectory.done:
+            # Finished predictions only need their paths
+            trajectory.sim = None
+            trajectory.balls = None
+        return trajectory
@@ -0,0 +1,280 @@
+"""
+Binary match replays, e.g. list the shots in one with
+    python -m physics.replay match.rpl
+
+A replay starts with a header of the step rate and the Simulation options the match
+was played with, followed by the mass of every ball. Records are appended as the match is played:
+    shot: the step it was played on, aim and power
+    keyframe: a TableSnapshot of every ball, written before each shot and every few steps in between
+A closed replay ends with an index of record offsets so readers can seek without
+scanning. Files that were never closed are scanned record by record instead.
+Everything is little endian, ball state is stored as float64 so playback is exact.
+"""
+import argparse
+import math
+import mmap
+import os
+import struct
+import sys
+from array import array
+from bisect import bisect_right
+
+from physics import geometry as physics_geometry
+from physics.simulation import Simulation, shot_force
+from physics.snapshot import FIELDS, TableSnapshot, capture, restore
+from physics.table import BallState, Table
+
+MAGIC = b"POOLRPL2"
+HEADER = struct.Struct("<8sHdBd") # magic, ball count, step rate, option flags, jaw radius (NaN for none)
+RECORD = struct.Struct("<BI") # kind, step
+SHOT_PAYLOAD = struct.Struct("<ddd") # aim x, aim y, power
+KEYFRAME_HEADER = struct.Struct("<Bi") # scratched, phase
+FOOTER = struct.Struct("<QI8s") # index offset, record count, magic
+INDEX_ENTRY = struct.Struct("<BIQ") # kind, step, record offset
+
+SHOT = 1
+KEYFRAME = 2
+
+# Option flags
+BROADPHASE = 1
+SLEEPING = 2
+CONTACTS = 4
+
+
+def keyframe_size(count: int) -> int:
+    return KEYFRAME_HEADER.size + 8 * FIELDS * count + 4 * count
+
+
+def header_size(count: int) -> int:
+    return HEADER.size + 8 * count
+
+
+def encode_header(masses: list[float], step_rate: float, broadphase: bool, sleeping: bool, contacts: bool, jaw_radius: float or None) -> bytes:
+    flags = (BROADPHASE if broadphase else 0) | (SLEEPING if sleeping else 0) | (CONTACTS if contacts else 0)
+    jaw = math.nan if jaw_radius is None else jaw_radius
+    return HEADER.pack(MAGIC, len(masses), step_rate, flags, jaw) + array("d", masses).tobytes()
+
+
+class ReplayWriter:
+    """
+    Appends to a replay file, an existing replay of the same balls and options is continued.
+    Steps must not go backwards, a continued replay goes on from next_step.
+    masses: of every ball in roster order
+    broadphase, sleeping, contacts, jaw_radius: the Simulation options the shots are played with,
+    see PoolGameState.make_simulation. play_shot plays them back the same way
+    """
+    def __init__(self, path, masses: list[float], step_rate: float, broadphase=False, sleeping=False, contacts=False, jaw_radius=None) -> None:
+        count = len(masses)
+        self.count = count
+        header = encode_header(masses, step_rate, broadphase, sleeping, contacts, jaw_radius)
+        self.index: list[tuple] = []
+        # First step after the records already in the file
+        self.next_step = 0
+        # Step of the latest keyframe written, None before the first
+        self.keyframe_step: int = None
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            with ReplayReader(path) as reader:
+                if reader.count != count:
+                    raise ValueError(f"{path} records {reader.count} balls, not {count}")
+                if reader.data[:len(header)] != header:
+                    raise ValueError(f"{path} was recorded with other ball masses or physics options")
+                self.index = list(reader.records)
+                end = reader.end
+            if self.index:
+                self.next_step = max(step for _, step, _ in self.index) + 1
+            self.file = open(path, "r+b")
+            # Drop the old index, it is written again on close
+            self.file.truncate(end)
+            self.file.seek(end)
+        else:
+            self.file = open(path, "wb")
+            self.file.write(header)
+        self.buffer: TableSnapshot = None
+
+    def append(self, kind, step, payload: bytes):
+        self.index.append((kind, step, self.file.tell()))
+        self.file.write(RECORD.pack(kind, step))
+        self.file.write(payload)
+
+    def shot(self, step: int, aim, power):
+        self.append(SHOT, step, SHOT_PAYLOAD.pack(aim[0], aim[1], power))
+
+    def keyframe(self, step: int, table: Table, roster: list[BallState], phase=0):
+        self.buffer = capture(table, roster, phase, self.buffer)
+        self.append(KEYFRAME, step, encode_snapshot(self.buffer))
+        self.keyframe_step = step
+
+    def flush(self):
+        self.file.flush()
+
+    def close(self):
+        if self.file.closed:
+            return
+        offset = self.file.tell()
+        for entry in self.index:
+            self.file.write(INDEX_ENTRY.pack(*entry))
+        self.file.write(FOOTER.pack(offset, len(self.index), MAGIC))
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def encode_snapshot(snapshot: TableSnapshot) -> bytes:
+    return (
+        KEYFRAME_HEADER.pack(snapshot.scratched, snapshot.phase)
+        + snapshot.kinematics.tobytes()
+        + snapshot.pocketed.tobytes()
+    )
+
+
+class ReplayReader:
+    """
+    Memory maps a replay, records are only decoded when asked for
+    records: (kind, step, offset) of every record in file order
+    masses: of every ball in roster order
+    """
+    def __init__(self, path) -> None:
+        self.file = open(path, "rb")
+        self.data = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, self.count, self.step_rate, flags, jaw = HEADER.unpack_from(self.data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a replay")
+        self.broadphase = bool(flags & BROADPHASE)
+        self.sleeping = bool(flags & SLEEPING)
+        self.contacts = bool(flags & CONTACTS)
+        self.jaw_radius = None if math.isnan(jaw) else jaw
+        self.masses = array("d", self.data[HEADER.size:header_size(self.count)]).tolist()
+        self.keyframe_size = keyframe_size(self.count)
+        # Where records end, the start of the index of a closed replay
+        self.end = len(self.data)
+        self.records = self.read_index()
+        if self.records is None:
+            self.records = self.scan()
+        self.shots = [record for record in self.records if record[0] == SHOT]
+        self.keyframes = [record for record in self.records if record[0] == KEYFRAME]
+        self.keyframe_steps = [record[1] for record in self.keyframes]
+        self.keyframe_offsets = [record[2] for record in self.keyframes]
+
+    def read_index(self) -> list[tuple] or None:
+        if len(self.data) < header_size(self.count) + FOOTER.size:
+            return None
+        offset, count, magic = FOOTER.unpack_from(self.data, len(self.data) - FOOTER.size)
+        if magic != MAGIC or offset + count * INDEX_ENTRY.size + FOOTER.size != len(self.data):
+            return None
+        self.end = offset
+        return [INDEX_ENTRY.unpack_from(self.data, offset + i * INDEX_ENTRY.size) for i in range(count)]
+
+    def scan(self) -> list[tuple]:
+        """
+        Index an unclosed replay, stops at a record cut short by a crash
+        """
+        records = []
+        offset = header_size(self.count)
+        while offset + RECORD.size <= len(self.data):
+            kind, step = RECORD.unpack_from(self.data, offset)
+            size = SHOT_PAYLOAD.size if kind == SHOT else self.keyframe_size
+            if kind not in (SHOT, KEYFRAME) or offset + RECORD.size + size > len(self.data):
+                break
+            records.append((kind, step, offset))
+            offset += RECORD.size + size
+        self.end = offset
+        return records
+
+    def __len__(self) -> int:
+        return len(self.shots)
+
+    def shot(self, n: int) -> tuple:
+        """
+        (step, aim, power) of the nth shot
+        """
+        _, step, offset = self.shots[n]
+        x, y, power = SHOT_PAYLOAD.unpack_from(self.data, offset + RECORD.size)
+        return step, (x, y), power
+
+    def keyframe(self, n: int) -> TableSnapshot:
+        _, step, offset = self.keyframes[n]
+        offset += RECORD.size
+        scratched, phase = KEYFRAME_HEADER.unpack_from(self.data, offset)
+        offset += KEYFRAME_HEADER.size
+        snapshot = TableSnapshot(0)
+        size = 8 * FIELDS * self.count
+        snapshot.kinematics = array("d", self.data[offset:offset + size])
+        snapshot.pocketed = array("i", self.data[offset + size:offset + size + 4 * self.count])
+        snapshot.scratched = bool(scratched)
+        snapshot.phase = phase
+        return snapshot
+
+    def shot_keyframe(self, n: int) -> TableSnapshot:
+        """
+        The table just before the nth shot was played
+        """
+        k = bisect_right(self.keyframe_offsets, self.shots[n][2]) - 1
+        if k < 0:
+            raise IndexError(f"no keyframe before shot {n}")
+        return self.keyframe(k)
+
+    def keyframe_at(self, step: int) -> tuple:
+        """
+        (step, snapshot) of the latest keyframe at or before step
+        """
+        n = bisect_right(self.keyframe_steps, step) - 1
+        if n < 0:
+            raise IndexError(f"no keyframe before step {step}")
+        return self.keyframe_steps[n], self.keyframe(n)
+
+    def simulation(self, table: Table) -> Simulation:
+        """
+        Simulation of table with the options the replay was recorded with
+        """
+        geometry = None
+        if self.jaw_radius is not None:
+            geometry = physics_geometry.from_table(table, self.jaw_radius)
+        return Simulation(table, self.broadphase, self.sleeping, self.contacts, geometry)
+
+    def close(self):
+        self.data.close()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def play_shot(reader: ReplayReader, n: int, table: Table, roster: list[BallState], make_simulation=None) -> Simulation:
+    """
+    Put table back to the start of the nth shot and play it, the returned
+    simulation is ready to step at reader.step_rate.
+    roster balls take the masses of the replay, make_simulation defaults to reader.simulation
+    """
+    _, aim, power = reader.shot(n)
+    restore(reader.shot_keyframe(n), table, roster)
+    for ball, mass in zip(roster, reader.masses):
+        ball.mass = mass
+    sim = (make_simulation or reader.simulation)(table)
+    sim.apply_force(table.cue_ball(), shot_force(table, aim, power))
+    return sim
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="List the shots in a replay")
+    parser.add_argument("replay")
+    args = parser.parse_args(argv)
+    with ReplayReader(args.replay) as reader:
+        sys.stdout.write(f"{reader.count} balls, {reader.step_rate:g} steps/s, {len(reader)} shots, {len(reader.keyframes)} keyframes\n")
+        options = [name for name in ("broadphase", "sleeping", "contacts") if getattr(reader, name)]
+        if reader.jaw_radius is not None:
+            options.append(f"jaw radius {reader.jaw_radius:g}")
+        sys.stdout.write(f"options: {', '.join(options) or 'none'}\n")
+        for n in range(len(reader)):
+            step, aim, power = reader.shot(n)
+            sys.stdout.write(f"{n:5} step {step:8} aim ({aim[0]:.4f}, {aim[1]:.4f}) power {power:.1f}\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,273 @@
+"""
+Large table layouts and a scaling report for the physics engines, e.g.
+    python -m physics.sandbox --layout pit --counts 100 1000 10000 --modes broadphase sleeping
+
+Layouts:
+    rack: a dense triangle rack with the cue ball driving into it
+    scatter: balls dropped at random spots with random velocities
+    pit: the whole table packed full and stirred
+Every layout is built on an open table (no pockets) sized to fit the balls,
+so the number of balls stays the same for the whole run.
+"""
+import argparse
+import importlib
+import json
+import math
+import random
+import sys
+import time
+
+from physics.broadphase import SpatialHash
+from physics.simulation import Simulation
+from physics.table import BALL_RADIUS, CUE_MASS, FRICTION, STEP_RATE, WALL_WIDTH, Table
+
+# Fraction of the playing surface the balls cover
+SCATTER_DENSITY = 0.25
+PIT_GAP = 1.05 # Spacing between pit balls in diameters
+
+
+def open_table(width, height, radius=BALL_RADIUS, friction=FRICTION) -> Table:
+    """
+    Pocketless table with a width x height playing surface whose top left corner is at the origin
+    """
+    w = WALL_WIDTH
+    walls = [
+        (-w, -w, width + 2 * w, w), # top
+        (-w, height, width + 2 * w, w), # bottom
+        (-w, -w, w, height + 2 * w), # left
+        (width, -w, w, height + 2 * w), # right
+    ]
+    return Table(walls, [], radius, 0, friction)
+
+
+def table_for_area(area, radius=BALL_RADIUS) -> Table:
+    """
+    Open table with a 2:1 playing surface of at least area
+    """
+    height = max(math.sqrt(area / 2), 4 * radius)
+    return open_table(2 * height, height, radius)
+
+
+def dense_rack(count, seed=0, table: Table = None, speed=2000) -> Table:
+    """
+    count - 1 object balls in a touching triangle, the cue ball heading into its apex
+    """
+    radius = table.radius if table is not None else BALL_RADIUS
+    rows = 0
+    while rows * (rows + 1) // 2 < count - 1:
+        rows += 1
+    column = math.sqrt(3) * radius
+    rack_width = rows * column
+    rack_height = rows * 2 * radius
+    if table is None:
+        # Leave as much room in front of the rack as it is wide
+        table = open_table(max(4 * rack_width, 8 * radius), max(2 * rack_height, 8 * radius), radius)
+    left, top, right, bottom = table.bounds
+    cy = (top + bottom) / 2
+    apex = right - rack_width - 2 * radius
+
+    rng = random.Random(seed)
+    table.add_ball((left + (apex - left) / 4, cy), CUE_MASS)
+    table.cue_ball().velocity[:] = [speed, rng.uniform(-1, 1)]
+    placed = 0
+    for row in range(rows):
+        for k in range(row + 1):
+            x = apex + row * column
+            y = cy + (2 * k - row) * radius
+            # A given table may be too small for the whole rack
+            if placed == count - 1 or x > right - radius or not top + radius <= y <= bottom - radius:
+                return table
+            table.add_ball((x, y))
+            placed += 1
+    return table
+
+
+def random_scatter(count, seed=0, table: Table = None, speed=300, density=SCATTER_DENSITY) -> Table:
+    """
+    count balls at random non overlapping spots, each moving in a random direction.
+    On a given table it stops early if it can't find room for the rest.
+    """
+    if table is None:
+        table = table_for_area(count * math.pi * BALL_RADIUS * BALL_RADIUS / density)
+    radius = table.radius
+    left, top, right, bottom = table.bounds
+    rng = random.Random(seed)
+    grid = SpatialHash(radius * 2)
+    reach = (radius * 2, radius * 2)
+    start = len(table.balls)
+    attempts = 0
+    while len(table.balls) - start < count and attempts < count * 100:
+        attempts += 1
+        pos = (rng.uniform(left + radius, right - radius), rng.uniform(top + radius, bottom - radius))
+        low = (pos[0] - reach[0], pos[1] - reach[1])
+        high = (pos[0] + reach[0], pos[1] + reach[1])
+        if any(math.dist(pos, table.balls[i].position) < 2 * radius for i in grid.query(low, high)):
+            continue
+        if any(math.dist(pos, hole) < table.hole_radius for hole in table.holes):
+            continue
+        grid.insert(len(table.balls), pos)
+        ball = table.add_ball(pos, CUE_MASS if not table.balls else 1)
+        a = rng.uniform(0, 2 * math.pi)
+        s = rng.uniform(0, speed)
+        ball.velocity[:] = [math.cos(a) * s, math.sin(a) * s]
+    return table
+
+
+def ball_pit(count, seed=0, table: Table = None, speed=100) -> Table:
+    """
+    count balls packed in hexagonal rows filling the table, all jostling.
+    On a given table it stops early once the table is full.
+    """
+    radius = table.radius if table is not None else BALL_RADIUS
+    spacing = 2 * radius * PIT_GAP
+    row_height = spacing * math.sqrt(3) / 2
+    area = count * spacing * row_height
+    fixed = table is not None
+    # Grow the table until the partial rows and columns at the walls leave room for everything
+    while True:
+        if not fixed:
+            table = table_for_area(area, radius)
+        left, top, right, bottom = table.bounds
+        rows = int((bottom - top - 2 * radius) // row_height) + 1
+        columns = int((right - left - 2 * radius - spacing / 2) // spacing) + 1
+        if fixed or rows * columns >= count:
+            break
+        area *= 1.1
+
+    rng = random.Random(seed)
+    placed = 0
+    for i in range(rows * columns):
+        if placed == count:
+            break
+        row, column = divmod(i, columns)
+        x = left + radius + column * spacing + (spacing / 2 if row % 2 else 0)
+        y = top + radius + row * row_height
+        if x > right - radius or any(math.dist((x, y), hole) < table.hole_radius for hole in table.holes):
+            continue
+        ball = table.add_ball((x, y), CUE_MASS if not table.balls else 1)
+        a = rng.uniform(0, 2 * math.pi)
+        ball.velocity[:] = [math.cos(a) * speed, math.sin(a) * speed]
+        placed += 1
+    return table
+
+
+LAYOUTS = {
+    "rack": dense_rack,
+    "scatter": random_scatter,
+    "pit": ball_pit,
+}
+
+
+def generate(layout: str, count: int, seed=0, table: Table = None) -> Table:
+    """
+    Lay out count balls, on table if given or else on a new open table sized to fit them
+    """
+    return LAYOUTS[layout](count, seed, table)
+
+
+def touching_pairs(positions, radius, grid: SpatialHash = None) -> int:
+    grid = grid or SpatialHash(radius * 2)
+    grid.rebuild(positions)
+    reach = (2 * radius) ** 2
+    count = 0
+    for i, j in grid.pairs():
+        a = positions[i]
+        b = positions[j]
+        if (a[0] - b[0]) ** 2 + (a[1] - b[1]) ** 2 <= reach:
+            count += 1
+    return count
+
+
+def stepper(table: Table, mode: str):
+    """
+    Step function, candidate pair counter and current ball positions for one engine mode
+    """
+    n = len(table.balls)
+    if mode == "vector":
+        from physics.vector_engine import from_table
+
+        physics = from_table(table)
+        return physics.step, lambda: n * (n - 1) // 2, lambda: physics.positions.tolist()
+    if mode == "contacts":
+        # Import numpy now so it isn't timed as part of the first step
+        importlib.import_module("numpy")
+
+    positions = lambda: [ball.position for ball in table.balls]
+    sim = Simulation(table, broadphase=mode in ("broadphase", "sleeping", "contacts"), sleeping=mode == "sleeping", contacts=mode == "contacts")
+    if sim.broadphase is None:
+        # The brute force loop visits every ordered pair
+        return sim.step, lambda: len(sim.stepped) * (len(sim.stepped) - 1), positions
+
+    grid = SpatialHash(table.radius * 2)
+
+    def candidates():
+        grid.rebuild([ball.position for ball in sim.stepped])
+        return sum(1 for _ in grid.pairs())
+    return sim.step, candidates, positions
+
+
+MODES = ("brute", "broadphase", "sleeping", "contacts", "vector")
+
+
+def measure(layout: str, count: int, mode: str, steps=60, seed=0, delta=1 / STEP_RATE) -> dict:
+    """
+    Run steps physics steps on a generated layout.
+    Pair counts are averaged per step and taken outside the timed region.
+    """
+    table = generate(layout, count, seed)
+    step, candidates, positions = stepper(table, mode)
+    grid = SpatialHash(table.radius * 2)
+    elapsed = 0
+    pairs = 0
+    contacts = 0
+    for _ in range(steps):
+        start = time.perf_counter()
+        step(delta)
+        elapsed += time.perf_counter() - start
+        pairs += candidates()
+        contacts += touching_pairs(positions(), table.radius, grid)
+    return {
+        "layout": layout,
+        "balls": count,
+        "mode": mode,
+        "steps": steps,
+        "seconds": elapsed,
+        "steps_per_second": steps / elapsed if elapsed else float("inf"),
+        "pairs_per_step": pairs / steps,
+        "contacts_per_step": contacts / steps,
+    }
+
+
+def report(rows, out):
+    out.write(f"{'layout':8} {'balls':>7} {'mode':10} {'steps/s':>10} {'pairs/step':>12} {'contacts/step':>14}\n")
+    for row in rows:
+        out.write(
+            f"{row['layout']:8} {row['balls']:>7} {row['mode']:10} {row['steps_per_second']:>10.1f} "
+            f"{row['pairs_per_step']:>12.0f} {row['contacts_per_step']:>14.1f}\n"
+        )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Measure how the physics engines scale with the number of balls")
+    parser.add_argument("--layout", choices=sorted(LAYOUTS), default="scatter")
+    parser.add_argument("--counts", type=int, nargs="+", default=[10, 100, 1000])
+    parser.add_argument("--modes", choices=MODES, nargs="+", default=["brute", "broadphase"])
+    parser.add_argument("--steps", type=int, default=60, help="physics steps per measurement")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--json", action="store_true", help="write one JSON object per measurement")
+    args = parser.parse_args(argv)
+
+    rows = []
+    for count in args.counts:
+        for mode in args.modes:
+            row = measure(args.layout, count, mode, args.steps, args.seed)
+            rows.append(row)
+            if args.json:
+                sys.stdout.write(json.dumps(row) + "\n")
+                sys.stdout.flush()
+    if not args.json:
+        report(rows, sys.stdout)
+
+
+if __name__ == "__main__":
+    main()
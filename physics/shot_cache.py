@@ -0,0 +1,83 @@
+import hashlib
+import json
+import os
+from collections import OrderedDict
+
+from physics.simulation import simulate_shot
+from physics.table import Table
+
+
+class ShotCache:
+    """
+    Memoizes simulate_shot.
+    Ball positions are snapped to a grid of `tolerance` pixels, aim to `aim_tolerance`
+    and power to `power_tolerance`, so nearly identical shots share one entry.
+    max_size: least recently used entries are evicted past this many
+    path: optional JSON file the cache is loaded from and saved to
+    """
+    def __init__(self, tolerance=0.5, aim_tolerance=1e-3, power_tolerance=0.5, max_size=4096, path=None) -> None:
+        self.tolerance = tolerance
+        self.aim_tolerance = aim_tolerance
+        self.power_tolerance = power_tolerance
+        self.max_size = max_size
+        self.path = path
+        self.entries: OrderedDict[str, dict] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        if path is not None and os.path.exists(path):
+            self.load(path)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+    def quantize(self, value, step) -> int:
+        return round(value / step)
+
+    def key(self, table: Table, aim, power, **options) -> str:
+        t = self.tolerance
+        parts = [
+            (self.quantize(ball.position[0], t), self.quantize(ball.position[1], t),
+             self.quantize(ball.velocity[0], t), self.quantize(ball.velocity[1], t), ball.mass)
+            for ball in table.balls
+        ]
+        parts.append((self.quantize(aim[0], self.aim_tolerance), self.quantize(aim[1], self.aim_tolerance)))
+        parts.append(self.quantize(power, self.power_tolerance))
+        parts.append((table.walls, table.holes, table.radius, table.friction))
+        parts.append(sorted(options.items()))
+        return hashlib.sha1(repr(parts).encode()).hexdigest()
+
+    def get(self, key: str) -> dict or None:
+        result = self.entries.get(key)
+        if result is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.entries.move_to_end(key)
+        return result
+
+    def put(self, key: str, result: dict):
+        self.entries[key] = result
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def simulate(self, table: Table, aim, power, **kwargs) -> dict:
+        """
+        Cached simulate_shot, table is not modified. kwargs are passed to simulate_shot.
+        """
+        key = self.key(table, aim, power, **kwargs)
+        result = self.get(key)
+        if result is None:
+            result = simulate_shot(table.copy(), aim, power, **kwargs)
+            self.put(key, result)
+        return result
+
+    def save(self, path=None):
+        path = path or self.path
+        with open(path, "w") as f:
+            json.dump(list(self.entries.items()), f)
+
+    def load(self, path):
+        with open(path) as f:
+            for key, result in json.load(f):
+                self.put(key, result)
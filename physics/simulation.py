@@ -0,0 +1,432 @@
+from itertools import combinations
+from math import sqrt
+
+from physics.broadphase import SpatialHash
+from physics.collision import circle_cushion_toi, resolve_contacts
+from physics.sleep import SleepTracker
+from physics.table import OFF_TABLE, STEP_RATE, BallState, Table
+
+# Up to this many balls, touching_pairs tests every pair instead of bucketing them in a grid
+DIRECT_PAIRS = 32
+
+
+def integrate(ball: BallState, delta, friction):
+    v = ball.velocity
+    f = ball.force
+    # Friction and any applied forces act once per step
+    v[0] += (f[0] - v[0] * friction) / ball.mass
+    v[1] += (f[1] - v[1] * friction) / ball.mass
+    f[0] = 0
+    f[1] = 0
+    ball.position[0] += v[0] * delta
+    ball.position[1] += v[1] * delta
+
+
+def collide_cushions(ball: BallState, delta, table: Table):
+    # Check for collision next frame, the cushion face is a plane so fast balls can't skip past it
+    for cushion in table.cushions:
+        t = circle_cushion_toi(ball.position, ball.velocity, table.radius, cushion)
+        if t is not None and t <= delta:
+            axis, coordinate, direction = cushion[:3]
+            ball.position[axis] = coordinate + direction * table.radius
+            ball.velocity[axis] *= -1
+
+
+def pos_after_time(ball: BallState, t) -> tuple:
+    return (ball.position[0] + ball.velocity[0] * t, ball.position[1] + ball.velocity[1] * t)
+
+
+def collide_pair(ball: BallState, other: BallState, delta, radius):
+    """
+    Resolve a collision between two balls if they touch at any time within the next delta,
+    or already overlap and are moving closer
+    """
+    # Inlined circle_circle_toi, this runs for every pair every step
+    p1, v1, p2, v2 = ball.position, ball.velocity, other.position, other.velocity
+    dx = p1[0] - p2[0]
+    dy = p1[1] - p2[1]
+    dvx = v1[0] - v2[0]
+    dvy = v1[1] - v2[1]
+    b = dx * dvx + dy * dvy
+    c = dx * dx + dy * dy - 4 * radius * radius
+    if c >= 0:
+        if b >= 0:
+            # Apart and not getting closer
+            return
+        a = dvx * dvx + dvy * dvy
+        disc = b * b - a * c
+        if disc < 0:
+            return
+        t = (-b - sqrt(disc)) / a
+        if t > delta:
+            return
+        # Swept contact, tested on the whole path so grazing balls can't tunnel
+        p1[0] += v1[0] * t
+        p1[1] += v1[1] * t
+        p2[0] += v2[0] * t
+        p2[1] += v2[1] * t
+    elif b >= 0:
+        # Resting or separating overlap, only push the balls apart
+        fix_intersection(ball, other, radius)
+        return
+    else:
+        a = dvx * dvx + dvy * dvy
+        t = (-b - sqrt(b * b - a * c)) / a
+        if t < -(delta * 3):
+            # Contact too far in the past, push the balls apart instead
+            fix_intersection(ball, other, radius)
+        else:
+            p1[0] += v1[0] * t
+            p1[1] += v1[1] * t
+            p2[0] += v2[0] * t
+            p2[1] += v2[1] * t
+    collide_ball(ball, other)
+
+
+def fix_intersection(ball: BallState, other: BallState, radius):
+    dx = ball.position[0] - other.position[0]
+    dy = ball.position[1] - other.position[1]
+    dist = sqrt(dx * dx + dy * dy)
+    if dist == 0:
+        dx, dy, dist = 1, 0, 1
+    overlap = radius * 2 - dist
+    if overlap <= 0:
+        return
+    # Push both balls out
+    push = overlap / 2 / dist
+    ball.position[0] += dx * push
+    ball.position[1] += dy * push
+    other.position[0] -= dx * push
+    other.position[1] -= dy * push
+
+
+def collide_ball(ball: BallState, other: BallState):
+    """
+    Elastic collision, exchanges the velocity components along the line between the centres
+    """
+    nx = ball.position[0] - other.position[0]
+    ny = ball.position[1] - other.position[1]
+    dist = sqrt(nx * nx + ny * ny)
+    if dist == 0:
+        return
+    nx /= dist
+    ny /= dist
+
+    v1 = ball.velocity
+    v2 = other.velocity
+    m1 = ball.mass
+    m2 = other.mass
+    vn1 = v1[0] * nx + v1[1] * ny
+    vn2 = v2[0] * nx + v2[1] * ny
+    vn1_final = (vn1 * (m1 - m2) + 2 * m2 * vn2) / (m1 + m2)
+    vn2_final = (vn2 * (m2 - m1) + 2 * m1 * vn1) / (m1 + m2)
+
+    v1[0] += (vn1_final - vn1) * nx
+    v1[1] += (vn1_final - vn1) * ny
+    v2[0] += (vn2_final - vn2) * nx
+    v2[1] += (vn2_final - vn2) * ny
+
+
+def is_sunk(ball: BallState, table: Table) -> bool:
+    x, y = ball.position
+    for hx, hy in table.holes:
+        if table.hole_radius > sqrt((x - hx) ** 2 + (y - hy) ** 2) + table.radius:
+            return True
+    return False
+
+
+class Simulation:
+    """
+    Steps a Table without pygame.
+    broadphase: only test ball pairs in neighbouring grid cells
+    sleeping: skip resting balls until something moving reaches them
+    contacts: resolve all contacts of a step together, fastest approaching first, see collision.resolve_contacts.
+    The result doesn't depend on the order of the balls
+    geometry: optional TableGeometry of polygonal cushions, jaws and pockets used instead of
+    the four straight cushions and round holes of the table
+    """
+    def __init__(self, table: Table, broadphase=False, sleeping=False, contacts=False, geometry=None) -> None:
+        self.table = table
+        self.contacts = contacts
+        self.geometry = geometry
+        self.broadphase = SpatialHash(table.radius * 2) if broadphase else None
+        self.sleep = None
+        if sleeping:
+            self.sleep = SleepTracker(table.radius * 2)
+            self.sleep.track(table.balls)
+        self.steps = 0
+        # Balls integrated by the latest step
+        self.stepped: list[BallState] = []
+
+    def awake(self) -> list[BallState]:
+        if self.sleep is not None:
+            return self.sleep.awake
+        return self.table.balls
+
+    def is_moving(self) -> bool:
+        if self.sleep is not None:
+            return self.sleep.active_count > 0
+        for ball in self.table.balls:
+            if ball.is_moving():
+                return True
+        return False
+
+    def apply_force(self, ball: BallState, force):
+        ball.apply_force(force)
+        if self.sleep is not None:
+            self.sleep.wake(ball)
+
+    def place(self, ball: BallState, position):
+        """
+        Move a ball directly and stop it, e.g. placing the cue ball after a scratch
+        """
+        if self.sleep is not None:
+            self.sleep.wake(ball)
+        ball.position[0] = position[0]
+        ball.position[1] = position[1]
+        ball.velocity[0] = 0
+        ball.velocity[1] = 0
+        if ball is self.table.cue_ball():
+            self.table.scratched = False
+
+    def reset(self):
+        """
+        Call after changing which balls are on the table outside of step, e.g. restoring a snapshot
+        """
+        if self.sleep is not None:
+            self.sleep = SleepTracker(self.table.radius * 2)
+            self.sleep.track(self.table.balls)
+        self.stepped = list(self.table.balls)
+
+    def step(self, delta) -> list[BallState]:
+        """
+        Advance the table by delta seconds, returns the balls pocketed this step
+        """
+        table = self.table
+        balls = table.balls
+        # Velocity each awake ball will have if nothing hits it this step
+        expected = {}
+        if self.sleep is not None:
+            # Wake anything a moving ball could reach this step, then only step awake balls.
+            # The reach includes the next frame the collisions look ahead to, see integrate
+            for ball in list(self.sleep.awake):
+                v, f = ball.velocity, ball.force
+                vx = v[0] + (f[0] - v[0] * table.friction) / ball.mass
+                vy = v[1] + (f[1] - v[1] * table.friction) / ball.mass
+                expected[ball] = (vx, vy)
+                end = (ball.position[0] + vx * 2 * delta, ball.position[1] + vy * 2 * delta)
+                self.sleep.wake_swept(ball.position, end)
+            balls = list(self.sleep.awake)
+        self.stepped = balls
+
+        sunk = []
+        if self.contacts:
+            for ball in balls:
+                integrate(ball, delta, table.friction)
+                self.collide_cushions(ball, delta)
+            self.solve_contacts(balls, delta)
+
+            for ball in balls:
+                if self.is_sunk(ball):
+                    sunk.append(ball)
+        elif self.broadphase is not None:
+            for ball in balls:
+                integrate(ball, delta, table.friction)
+                self.collide_cushions(ball, delta)
+
+            # Pairs touching at any time next frame are within reach of each other's
+            # position halfway through it, the cells have to cover that reach
+            reach = max((abs(ball.velocity[0]) + abs(ball.velocity[1]) for ball in balls), default=0) * delta
+            self.broadphase.cell_size = table.radius * 2 + reach
+            self.broadphase.rebuild([pos_after_time(ball, delta / 2) for ball in balls])
+            for i, j in self.broadphase.pairs():
+                collide_pair(balls[i], balls[j], delta, table.radius)
+
+            for ball in balls:
+                if self.is_sunk(ball):
+                    sunk.append(ball)
+        else:
+            for ball in balls:
+                integrate(ball, delta, table.friction)
+                self.collide_cushions(ball, delta)
+                for other in balls:
+                    if other is not ball:
+                        collide_pair(ball, other, delta, table.radius)
+                if self.is_sunk(ball):
+                    sunk.append(ball)
+        if self.sleep is not None and not self.contacts:
+            self.wake_hit(expected, delta)
+
+        for ball in sunk:
+            self.sink(ball)
+        if self.sleep is not None:
+            self.sleep.settle()
+        self.steps += 1
+        return sunk
+
+    def wake_hit(self, expected: dict, delta):
+        """
+        Wake the sleepers a collision sent a ball towards during this step and collide them
+        straight away, or the ball would already be inside them when they wake next step.
+        Repeats for the balls those collisions set moving until nothing new wakes.
+        expected: velocity each ball had if nothing hit it this step
+        """
+        sleep = self.sleep
+        radius = self.table.radius
+        changed = [ball for ball in sleep.awake if tuple(ball.velocity) != expected.get(ball)]
+        while changed:
+            count = len(sleep.awake)
+            for ball in changed:
+                v = ball.velocity
+                sleep.wake_swept(ball.position, (ball.position[0] + v[0] * 2 * delta, ball.position[1] + v[1] * 2 * delta))
+            woken = sleep.awake[count:]
+            if not woken:
+                return
+            # The other awake balls kept the velocity their paths were swept with,
+            # they can't reach the woken ones
+            near = changed + woken
+            before = [tuple(ball.velocity) for ball in near]
+            for ball in woken:
+                for other in near:
+                    if other is not ball:
+                        collide_pair(ball, other, delta, radius)
+            changed = [ball for ball, velocity in zip(near, before) if tuple(ball.velocity) != velocity]
+
+    def collide_cushions(self, ball: BallState, delta):
+        if self.geometry is not None:
+            self.geometry.collide(ball, delta)
+        else:
+            collide_cushions(ball, delta, self.table)
+
+    def is_sunk(self, ball: BallState) -> bool:
+        if self.geometry is not None:
+            return self.geometry.pocket_at(ball.position) is not None
+        return is_sunk(ball, self.table)
+
+    def touching_pairs(self, balls: list[BallState], delta) -> list[tuple]:
+        """
+        Pairs (i, j), i < j, of balls that touch now or will after moving for delta.
+        Only clusters of touching balls with a contact that is closing or overlapping are kept,
+        a resting rack has nothing to solve
+        """
+        grid = self.broadphase
+        if grid is None and len(balls) <= DIRECT_PAIRS:
+            # Testing every pair of a few balls is cheaper than bucketing them
+            candidates = combinations(range(len(balls)), 2)
+        else:
+            if grid is None:
+                grid = self.broadphase = SpatialHash(self.table.radius * 2)
+            # A pair touching at either end of the step is within reach of its halfway positions
+            reach = max((abs(ball.velocity[0]) + abs(ball.velocity[1]) for ball in balls), default=0) * delta
+            grid.cell_size = self.table.radius * 2 + reach
+            grid.rebuild([pos_after_time(ball, delta / 2) for ball in balls])
+            candidates = grid.pairs()
+        touch = 4 * self.table.radius * self.table.radius
+        # Balls placed exactly touching are a rounding error away from overlapping
+        overlap = touch * (1 - 1e-9)
+        pairs = []
+        active = False
+        for i, j in candidates:
+            p1, v1, p2, v2 = balls[i].position, balls[i].velocity, balls[j].position, balls[j].velocity
+            dx = p1[0] - p2[0]
+            dy = p1[1] - p2[1]
+            dvx = v1[0] - v2[0]
+            dvy = v1[1] - v2[1]
+            distance = dx * dx + dy * dy
+            if distance > touch:
+                fx = dx + dvx * delta
+                fy = dy + dvy * delta
+                if fx * fx + fy * fy > touch:
+                    continue
+            closing = distance < overlap or dx * dvx + dy * dvy < 0
+            active = active or closing
+            pairs.append((i, j, closing))
+        if not active:
+            return []
+
+        # Keep the clusters an active contact belongs to
+        parent = {}
+
+        def find(a):
+            while parent.get(a, a) != a:
+                a = parent[a]
+            return a
+
+        for i, j, _ in pairs:
+            a, b = find(i), find(j)
+            if a != b:
+                parent[max(a, b)] = min(a, b)
+        live = set(find(i) for i, _, closing in pairs if closing)
+        return [(i, j) for i, j, _ in pairs if find(i) in live]
+
+    def solve_contacts(self, balls: list[BallState], delta):
+        pairs = self.touching_pairs(balls, delta)
+        if pairs:
+            resolve_contacts(
+                [ball.position for ball in balls], [ball.velocity for ball in balls], [ball.mass for ball in balls],
+                pairs, self.table.radius,
+            )
+
+    def sink(self, ball: BallState):
+        table = self.table
+        if ball is table.cue_ball():
+            table.scratched = True
+            ball.position[0], ball.position[1] = OFF_TABLE
+            ball.velocity[0] = 0
+            ball.velocity[1] = 0
+        else:
+            table.balls.remove(ball)
+            table.pocketed.append(ball)
+            if self.sleep is not None:
+                self.sleep.remove(ball)
+
+    def run(self, delta, max_steps=100000) -> int:
+        """
+        Step until every ball is at rest, returns the number of steps taken
+        """
+        start = self.steps
+        self.step(delta)
+        while self.is_moving() and self.steps - start < max_steps:
+            self.step(delta)
+        return self.steps - start
+
+
+def shot_force(table: Table, aim, power) -> tuple:
+    """
+    Force PoolGameState.shoot applies to the cue ball, aim is a unit vector
+    """
+    scale = power * table.cue_ball().mass * 10
+    return (aim[0] * scale, aim[1] * scale)
+
+
+def simulate_shot(table: Table, aim, power, delta=1 / STEP_RATE, max_steps=100000, broadphase=False, sleeping=False, geometry=None, contacts=False, engine="steps") -> dict:
+    """
+    Play a shot on table until every ball is at rest.
+    Returns final positions (None for pocketed balls) and pocketed indices, both in the order of table.balls.
+    A scratched cue ball counts as pocketed.
+    engine: "steps" for Simulation, "vector" for VectorPhysics or "events" for the EventSimulator,
+    the other engines ignore the Simulation options and leave table as it was
+    """
+    if engine == "vector":
+        # numpy is only needed for the vectorized engine
+        from physics.vector_engine import simulate_shot as simulate_vector
+
+        return simulate_vector(table, shot_force(table, aim, power), delta, max_steps)
+    if engine == "events":
+        from physics.events import simulate_shot as simulate_events
+
+        return simulate_events(table, shot_force(table, aim, power), delta, max_steps)
+    balls = list(table.balls)
+    sim = Simulation(table, broadphase, sleeping, contacts, geometry)
+    sim.apply_force(table.cue_ball(), shot_force(table, aim, power))
+    steps = sim.run(delta, max_steps)
+
+    pocketed = set(id(ball) for ball in table.pocketed)
+    if table.scratched:
+        pocketed.add(id(table.cue_ball()))
+    return {
+        "positions": [None if id(ball) in pocketed else list(ball.position) for ball in balls],
+        "pocketed": [i for i, ball in enumerate(balls) if id(ball) in pocketed],
+        "scratch": table.scratched,
+        "steps": steps,
+    }
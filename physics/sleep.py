@@ -0,0 +1,77 @@
+from physics.broadphase import SpatialHash
+
+
+class SleepTracker:
+    """
+    Keeps resting bodies out of the physics step.
+    Bodies need position, velocity and is_moving(). Sleeping bodies are kept in a
+    spatial hash so a moving body only has to look at the sleepers near its path.
+    reach: distance between centres at which two bodies touch
+    """
+    def __init__(self, reach: float) -> None:
+        self.reach = reach
+        self.awake: list = []
+        self.sleepers = SpatialHash(reach)
+        # Position each sleeper was hashed at
+        self.sleeping: dict = {}
+
+    @property
+    def active_count(self) -> int:
+        return len(self.awake)
+
+    def track(self, bodies):
+        for body in bodies:
+            self.awake.append(body)
+
+    def is_sleeping(self, body) -> bool:
+        return body in self.sleeping
+
+    def sleep(self, body):
+        self.awake.remove(body)
+        body.velocity[0] = 0
+        body.velocity[1] = 0
+        pos = (body.position[0], body.position[1])
+        self.sleeping[body] = pos
+        self.sleepers.insert(body, pos)
+
+    def wake(self, body):
+        pos = self.sleeping.pop(body, None)
+        if pos is None:
+            return
+        self.sleepers.remove(body, pos)
+        self.awake.append(body)
+
+    def remove(self, body):
+        if body in self.sleeping:
+            self.sleepers.remove(body, self.sleeping.pop(body))
+        elif body in self.awake:
+            self.awake.remove(body)
+
+    def wake_swept(self, start, end):
+        """
+        Wake every sleeper within reach of the segment a body sweeps from start to end
+        """
+        reach = self.reach
+        low = (min(start[0], end[0]) - reach, min(start[1], end[1]) - reach)
+        high = (max(start[0], end[0]) + reach, max(start[1], end[1]) + reach)
+        dx = end[0] - start[0]
+        dy = end[1] - start[1]
+        length_sq = dx * dx + dy * dy
+        for body in list(self.sleepers.query(low, high)):
+            x, y = self.sleeping[body]
+            # Closest point on the swept segment
+            t = 0
+            if length_sq > 0:
+                t = min(max(((x - start[0]) * dx + (y - start[1]) * dy) / length_sq, 0), 1)
+            cx = start[0] + dx * t - x
+            cy = start[1] + dy * t - y
+            if cx * cx + cy * cy <= reach * reach:
+                self.wake(body)
+
+    def settle(self):
+        """
+        Put every awake body that has stopped moving to sleep
+        """
+        for body in list(self.awake):
+            if not body.is_moving():
+                self.sleep(body)
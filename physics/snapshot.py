@@ -0,0 +1,111 @@
+from array import array
+
+from physics.table import BallState, Table
+
+# Doubles stored per ball: position, velocity and pending force
+FIELDS = 6
+
+
+class TableSnapshot:
+    """
+    Compact copy of a table's state.
+    roster: every ball the table can ever hold in a fixed order, on the table or pocketed.
+    kinematics holds FIELDS doubles per roster ball, pocketed the 1 based order each
+    ball was pocketed in (0 while it is on the table). phase is free for the caller, e.g. a game state.
+    """
+    __slots__ = ("kinematics", "pocketed", "scratched", "phase")
+
+    def __init__(self, count: int) -> None:
+        self.kinematics = array("d", bytes(8 * FIELDS * count))
+        self.pocketed = array("i", bytes(4 * count))
+        self.scratched = False
+        self.phase = 0
+
+    def __len__(self) -> int:
+        return len(self.pocketed)
+
+
+def capture(table: Table, roster: list[BallState], phase=0, into: TableSnapshot = None) -> TableSnapshot:
+    """
+    Snapshot table, reusing into's buffers when it has room for the roster
+    """
+    if into is None or len(into) != len(roster):
+        into = TableSnapshot(len(roster))
+    k = into.kinematics
+    order = {ball: n for n, ball in enumerate(table.pocketed, 1)}
+    for i, ball in enumerate(roster):
+        j = i * FIELDS
+        k[j], k[j + 1] = ball.position
+        k[j + 2], k[j + 3] = ball.velocity
+        k[j + 4], k[j + 5] = ball.force
+        into.pocketed[i] = order.get(ball, 0)
+    into.scratched = table.scratched
+    into.phase = phase
+    return into
+
+
+def restore(snapshot: TableSnapshot, table: Table, roster: list[BallState]):
+    """
+    Put table back the way it was when snapshot was captured, ball objects are reused
+    """
+    k = snapshot.kinematics
+    balls = []
+    pocketed = {}
+    for i, ball in enumerate(roster):
+        j = i * FIELDS
+        ball.position[0] = k[j]
+        ball.position[1] = k[j + 1]
+        ball.velocity[0] = k[j + 2]
+        ball.velocity[1] = k[j + 3]
+        ball.force[0] = k[j + 4]
+        ball.force[1] = k[j + 5]
+        n = snapshot.pocketed[i]
+        if n:
+            pocketed[n] = ball
+        else:
+            balls.append(ball)
+    table.balls[:] = balls
+    table.pocketed[:] = [pocketed[n] for n in sorted(pocketed)]
+    table.scratched = snapshot.scratched
+
+
+class SnapshotRing:
+    """
+    The latest capacity snapshots of a table. Slots are allocated once and overwritten
+    """
+    def __init__(self, capacity: int) -> None:
+        self.slots: list[TableSnapshot] = [None] * capacity
+        self.head = 0 # Slot the next snapshot goes in
+        self.count = 0
+
+    def __len__(self) -> int:
+        return self.count
+
+    def push(self, table: Table, roster: list[BallState], phase=0) -> TableSnapshot:
+        snapshot = capture(table, roster, phase, self.slots[self.head])
+        self.slots[self.head] = snapshot
+        self.head = (self.head + 1) % len(self.slots)
+        self.count = min(self.count + 1, len(self.slots))
+        return snapshot
+
+    def latest(self, back: int = 0) -> TableSnapshot or None:
+        """
+        Snapshot back pushes before the latest one, None if it has been overwritten
+        """
+        if back >= self.count:
+            return None
+        return self.slots[(self.head - 1 - back) % len(self.slots)]
+
+    def pop(self) -> TableSnapshot or None:
+        """
+        Remove and return the latest snapshot, its slot is reused by the next push
+        """
+        if self.count == 0:
+            return None
+        self.head = (self.head - 1) % len(self.slots)
+        self.count -= 1
+        return self.slots[self.head]
+
+    def clear(self):
+        self.head = 0
+        self.count = 0
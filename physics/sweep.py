@@ -0,0 +1,76 @@
+import multiprocessing
+import os
+from math import ceil
+
+from physics.batch import parse_aim
+from physics.simulation import simulate_shot
+from physics.table import STEP_RATE, Table
+
+
+def shot_grid(angles, powers) -> list[tuple]:
+    """
+    Every (angle, power) combination, angles in degrees
+    """
+    return [(angle, power) for angle in angles for power in powers]
+
+
+def evaluate_chunk(job) -> list[dict]:
+    table, shots, delta, max_steps, broadphase, sleeping = job
+    return [
+        simulate_shot(table.copy(), parse_aim(aim), power, delta, max_steps, broadphase, sleeping)
+        for aim, power in shots
+    ]
+
+
+class ShotSweeper:
+    """
+    Evaluates many candidate shots from the same table on a process pool.
+    The pool is started on the first sweep and reused until close().
+    processes: worker count, defaults to the number of cores
+    chunksize: shots per job, defaults to about four jobs per worker
+    """
+    def __init__(self, processes: int = None, chunksize: int = None, delta=1 / STEP_RATE, max_steps=100000, broadphase=False, sleeping=False) -> None:
+        self.processes = processes or os.cpu_count() or 1
+        self.chunksize = chunksize
+        self.delta = delta
+        self.max_steps = max_steps
+        self.broadphase = broadphase
+        self.sleeping = sleeping
+        self.pool = None
+
+    def sweep(self, table: Table, shots, progress=None) -> list[dict]:
+        """
+        Simulate every (aim, power) in shots from table, aim is degrees or a direction.
+        Results come back in the same order as shots.
+        progress: called with (shots done, total shots) as chunks finish
+        """
+        shots = list(shots)
+        if not shots:
+            return []
+        if self.pool is None:
+            self.pool = multiprocessing.Pool(self.processes)
+
+        size = self.chunksize or max(1, ceil(len(shots) / (self.processes * 4)))
+        jobs = [
+            (table, shots[i:i + size], self.delta, self.max_steps, self.broadphase, self.sleeping)
+            for i in range(0, len(shots), size)
+        ]
+
+        results = []
+        for chunk in self.pool.imap(evaluate_chunk, jobs):
+            results.extend(chunk)
+            if progress is not None:
+                progress(len(results), len(shots))
+        return results
+
+    def close(self):
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
@@ -0,0 +1,129 @@
+BALL_RADIUS = 10
+HOLE_RADIUS = 20
+FRICTION = 0.02
+STEP_RATE = 60 # Physics steps per second FRICTION is tuned for
+TABLE_SIZE = (640, 320)
+WALL_WIDTH = 10
+CUE_MASS = 1.005
+# Where a scratched cue ball waits until it is placed again
+OFF_TABLE = (-50, -50)
+
+
+class BallState:
+    """
+    Plain data kinematics of one ball, positions and vectors are [x, y] lists
+    """
+    __slots__ = ("position", "velocity", "force", "mass")
+
+    def __init__(self, position, mass=1.0, velocity=(0, 0)) -> None:
+        self.position = [float(position[0]), float(position[1])]
+        self.velocity = [float(velocity[0]), float(velocity[1])]
+        self.force = [0.0, 0.0]
+        self.mass = mass
+
+    def is_moving(self) -> bool:
+        return self.velocity[0] * self.velocity[0] + self.velocity[1] * self.velocity[1] > 0.05
+
+    def apply_force(self, force):
+        self.force[0] += force[0]
+        self.force[1] += force[1]
+
+    def copy(self):
+        ball = BallState(self.position, self.mass, self.velocity)
+        ball.force = list(self.force)
+        return ball
+
+    def __repr__(self) -> str:
+        return f"BallState(position={self.position}, velocity={self.velocity}, mass={self.mass})"
+
+
+class Table:
+    """
+    Plain data pool table.
+    walls: top, bottom, left and right cushion rectangles as (x, y, width, height)
+    holes: pocket centres
+    balls: the cue ball is always balls[0]
+    """
+    def __init__(self, walls: list, holes: list, radius=BALL_RADIUS, hole_radius=HOLE_RADIUS, friction=FRICTION) -> None:
+        self.walls = [tuple(wall) for wall in walls]
+        self.holes = [tuple(hole) for hole in holes]
+        self.radius = radius
+        self.hole_radius = hole_radius
+        self.friction = friction
+        self.balls: list[BallState] = []
+        self.pocketed: list[BallState] = []
+        self.scratched = False
+
+        top, bottom, left, right = self.walls
+        # (left, top, right, bottom) of the playing surface inside the cushions
+        self.bounds = (left[0] + left[2], top[1] + top[3], right[0], bottom[1])
+        # Cushion faces as (axis, coordinate, direction, low, high), see circle_cushion_toi
+        self.cushions = [
+            (1, top[1] + top[3], 1, top[0], top[0] + top[2]),
+            (1, bottom[1], -1, bottom[0], bottom[0] + bottom[2]),
+            (0, left[0] + left[2], 1, left[1], left[1] + left[3]),
+            (0, right[0], -1, right[1], right[1] + right[3]),
+        ]
+
+    def cue_ball(self) -> BallState:
+        return self.balls[0]
+
+    def add_ball(self, position, mass=1.0) -> BallState:
+        ball = BallState(position, mass)
+        self.balls.append(ball)
+        return ball
+
+    def copy(self):
+        table = Table(self.walls, self.holes, self.radius, self.hole_radius, self.friction)
+        table.balls = [ball.copy() for ball in self.balls]
+        table.pocketed = [ball.copy() for ball in self.pocketed]
+        table.scratched = self.scratched
+        return table
+
+
+def standard_table(screen_height=480) -> Table:
+    """
+    The table PoolGameState plays on, vertically centred on a screen_height tall screen
+    """
+    tw, th = TABLE_SIZE
+    width = WALL_WIDTH
+    margin_top = (screen_height - th) / 2
+    walls = [
+        (0, margin_top, tw, width), # top
+        (0, th - width + margin_top, tw, width), # bottom
+        (0, margin_top, width, th), # left
+        (tw - width, margin_top, width, th), # right
+    ]
+
+    r = HOLE_RADIUS
+    margin = 5
+    rm = r + margin
+    holes = [
+        (rm, rm + margin_top), (tw - rm, rm + margin_top), (tw - rm, th - rm + margin_top), (rm, th - rm + margin_top),
+        (tw / 2, rm + margin_top), (tw / 2, th - rm + margin_top)
+    ]
+    return Table(walls, holes)
+
+
+def rack_positions(screen_size=(640, 480)) -> list[tuple]:
+    """
+    Starting spots of the cue ball followed by the nine object balls
+    """
+    w, h = screen_size
+    r = BALL_RADIUS
+    d = BALL_RADIUS * 2
+    return [
+        (w/4, h/2), # cue ball
+        (3*w/4, h/2),
+        (3*w/4 + d, h/2 + r), (3*w/4 + d, h/2 - r),
+        (3*w/4 + 2*d, h/2), (3*w/4 + 2*d, h/2 - d), (3*w/4 + 2*d, h/2 + d),
+        (3*w/4 + 3*d, h/2 + r), (3*w/4 + 3*d, h/2 - r),
+        (3*w/4 + 4*d, h/2),
+    ]
+
+
+def racked_table(screen_size=(640, 480)) -> Table:
+    table = standard_table(screen_size[1])
+    for i, position in enumerate(rack_positions(screen_size)):
+        table.add_ball(position, CUE_MASS if i == 0 else 1)
+    return table
@@ -0,0 +1,220 @@
+import sys
+
+import numpy as np
+
+from physics.contacts import solve_contacts
+from physics.table import BALL_RADIUS, OFF_TABLE, STEP_RATE, racked_table
+
+
+class VectorPhysics:
+    """
+    Structure-of-arrays ball physics.
+    Positions, velocities, masses and pending forces of every ball are kept in
+    contiguous arrays and the whole table is stepped with the batched kernels below.
+    bounds: (left, top, right, bottom) of the playing surface inside the cushions
+    """
+    def __init__(self, radius: float, friction: float, bounds: tuple, holes=(), hole_radius: float = 0) -> None:
+        self.radius = radius
+        self.friction = friction
+        self.bounds = bounds
+        self.holes = np.array(holes, dtype=np.float64).reshape(-1, 2)
+        self.hole_radius = hole_radius
+
+        self.positions = np.zeros((0, 2), dtype=np.float64)
+        self.velocities = np.zeros((0, 2), dtype=np.float64)
+        self.forces = np.zeros((0, 2), dtype=np.float64)
+        self.masses = np.zeros(0, dtype=np.float64)
+
+    def __len__(self) -> int:
+        return len(self.masses)
+
+    def add_ball(self, position, mass=1.0, velocity=(0, 0)) -> int:
+        self.positions = np.vstack((self.positions, position))
+        self.velocities = np.vstack((self.velocities, velocity))
+        self.forces = np.vstack((self.forces, (0, 0)))
+        self.masses = np.append(self.masses, mass)
+        return len(self.masses) - 1
+
+    def remove(self, index: int):
+        self.positions = np.delete(self.positions, index, axis=0)
+        self.velocities = np.delete(self.velocities, index, axis=0)
+        self.forces = np.delete(self.forces, index, axis=0)
+        self.masses = np.delete(self.masses, index)
+
+    def apply_force(self, index: int, force):
+        self.forces[index] += force
+
+    def moving(self) -> np.ndarray:
+        return np.einsum("ij,ij->i", self.velocities, self.velocities) > 0.05
+
+    def step(self, delta) -> np.ndarray:
+        """
+        Advance every ball by delta seconds.
+        Returns the indices of balls that ended the step inside a hole
+        """
+        # The kernels work on a batch of tables, this is a batch of one
+        p = self.positions[None]
+        v = self.velocities[None]
+        integrate(p, v, self.forces[None], self.masses[None], self.friction, delta)
+        collide_walls(p, v, self.bounds, self.radius, delta)
+        collide_balls(p, v, self.masses[None], self.radius, delta)
+        return self.sunk()
+
+    def sunk(self) -> np.ndarray:
+        if len(self.holes) == 0 or len(self.masses) == 0:
+            return np.zeros(0, dtype=np.intp)
+        return np.flatnonzero(in_holes(self.positions[None], self.holes, self.radius, self.hole_radius)[0])
+
+
+# Batched kernels shared by VectorPhysics and MultiTablePhysics.
+# Ball arrays have a leading table dimension, (tables, balls, 2) for vectors and (tables, balls) for masses.
+# alive: optional (tables, balls) mask of the slots holding a ball, every slot does if it is None
+
+def integrate(p, v, f, masses, friction, delta, alive=None):
+    """
+    Apply friction and pending forces once, clear the forces and move every ball
+    """
+    change = (f - v * friction) / masses[:, :, None]
+    if alive is not None:
+        change = np.where(alive[:, :, None], change, 0)
+    v += change
+    f[:] = 0
+    p += v * delta
+
+
+def collide_walls(p, v, bounds, radius, delta, alive=None):
+    """
+    Bounce balls that would cross the cushions of bounds (left, top, right, bottom) next frame
+    """
+    left, top, right, bottom = bounds
+    future = p + v * delta
+    for axis, low, high in ((0, left, right), (1, top, bottom)):
+        hit_low = future[:, :, axis] - radius < low
+        hit_high = future[:, :, axis] + radius > high
+        if alive is not None:
+            hit_low &= alive
+            hit_high &= alive
+        p[:, :, axis][hit_low] = low + radius
+        p[:, :, axis][hit_high] = high - radius
+        v[:, :, axis][hit_low | hit_high] *= -1
+
+
+def collide_balls(p, v, masses, radius, delta, alive=None):
+    """
+    Collisions between the balls of each table that touch now or next frame, see contacts.solve_contacts.
+    Every table is one block of the flattened arrays, pairs never cross tables
+    """
+    tables, n = p.shape[:2]
+    if n < 2:
+        return
+    i, j = np.triu_indices(n, 1)
+    start = np.arange(tables)[:, None] * n
+    first = (start + i).ravel()
+    second = (start + j).ravel()
+    if alive is not None:
+        live = (alive[:, i] & alive[:, j]).ravel()
+        first, second = first[live], second[live]
+    # p and v are contiguous, so the reshaped views are updated in place
+    solve_contacts(p.reshape(-1, 2), v.reshape(-1, 2), masses.reshape(-1), radius, delta, (first, second))
+
+
+def in_holes(p, holes, radius, hole_radius) -> np.ndarray:
+    """
+    (tables, balls) mask of the balls entirely inside one of holes
+    """
+    offset = p[:, :, None, :] - holes[None, None, :, :]
+    dist = np.sqrt(np.einsum("tnhk,tnhk->tnh", offset, offset))
+    return (dist + radius < hole_radius).any(axis=2)
+
+
+def from_table(table) -> VectorPhysics:
+    """
+    Load every ball of a Table, pending forces included. Indices in the engine match table.balls
+    """
+    physics = VectorPhysics(table.radius, table.friction, table.bounds, table.holes, table.hole_radius)
+    for ball in table.balls:
+        physics.apply_force(physics.add_ball(ball.position, ball.mass, ball.velocity), ball.force)
+    return physics
+
+
+def simulate_shot(table, cue_force, delta=1 / STEP_RATE, max_steps=100000) -> dict:
+    """
+    Play a shot on the vectorized engine the way PoolGameState plays it, a pocketed
+    cue ball is parked off the table and other balls are removed.
+    Same result as simulation.simulate_shot, table is not modified
+    """
+    physics = from_table(table)
+    physics.apply_force(0, cue_force)
+    # Index in table.balls of each ball still in the engine
+    remaining = list(range(len(table.balls)))
+    pocketed = []
+    steps = 0
+    while steps < max_steps:
+        for index in reversed(physics.step(delta)):
+            if index == 0:
+                physics.positions[0] = OFF_TABLE
+                physics.velocities[0] = 0
+                pocketed.append(0)
+            else:
+                physics.remove(index)
+                pocketed.append(remaining.pop(index))
+        steps += 1
+        if not physics.moving().any():
+            break
+    positions = [None] * len(table.balls)
+    for i, position in zip(remaining, physics.positions.tolist()):
+        if i not in pocketed:
+            positions[i] = position
+    return {
+        "positions": positions,
+        "pocketed": sorted(pocketed),
+        "scratch": 0 in pocketed,
+        "steps": steps,
+    }
+
+
+def kinetic_energy(velocities, masses) -> float:
+    return float(0.5 * (masses * (velocities * velocities).sum(axis=-1)).sum())
+
+
+def check_conservation(speed=600, steps=120) -> float:
+    """
+    Without friction, roll a ball into a line of three touching balls and break a rack,
+    on VectorPhysics and on MultiTablePhysics. Raises AssertionError if kinetic energy
+    isn't conserved or the line doesn't pass the ball's velocity on to its far end,
+    returns the largest relative energy change
+    """
+    from physics.multi_table import MultiTablePhysics
+
+    worst = 0
+    d = 2 * BALL_RADIUS
+    physics = VectorPhysics(BALL_RADIUS, 0, (0, 0, 2000, 1000))
+    physics.add_ball((100, 500), velocity=(speed, 0))
+    for k in range(3):
+        physics.add_ball((300 + d * k, 500))
+    energy = kinetic_energy(physics.velocities, physics.masses)
+    for _ in range(steps):
+        physics.step(1 / STEP_RATE)
+        worst = max(worst, abs(kinetic_energy(physics.velocities, physics.masses) / energy - 1))
+    assert np.allclose(physics.velocities, [(0, 0), (0, 0), (0, 0), (speed, 0)]), f"line ended with velocities {physics.velocities.tolist()}"
+
+    table = racked_table()
+    table.friction = 0
+    table.cue_ball().velocity[:] = (speed, 0)
+    tables = MultiTablePhysics([table, table])
+    energy = kinetic_energy(tables.velocities, tables.masses)
+    for _ in range(steps):
+        tables.step(1 / STEP_RATE)
+        # A pocketed ball takes its energy with it, only compare until the first one drops
+        if tables.alive.all() and not tables.scratched.any():
+            worst = max(worst, abs(kinetic_energy(tables.velocities, tables.masses) / energy - 1))
+    assert worst < 1e-9, f"kinetic energy changed by {worst:.3g}"
+    return worst
+
+
+def main():
+    sys.stdout.write(f"kinetic energy conserved to {check_conservation():.3g}\n")
+
+
+if __name__ == "__main__":
+    main()
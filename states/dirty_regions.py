@@ -0,0 +1,50 @@
+from pygame import Rect
+
+
+class DirtyRegions:
+    """
+    Works out which parts of the screen changed between two frames.
+    Each frame, mark where every drawn thing is now. Anything that moved or whose
+    content changed dirties both its old and new rect, anything that is no longer
+    marked dirties its old rect.
+    """
+    def __init__(self) -> None:
+        self.last: dict = {}
+        self.current: dict = {}
+        self.rects: list[Rect] = []
+        self.everything = True
+
+    def mark(self, key, rect: Rect, content=None):
+        """
+        key is drawn at rect this frame, None if it isn't drawn.
+        content: anything that compares equal as long as key looks the same inside its rect,
+        e.g. the points of a line, leave it None for things that only move
+        """
+        if rect is None:
+            return
+        last = self.last.get(key)
+        if last is None:
+            self.rects.append(Rect(rect))
+        elif last[0] != rect or last[1] != content:
+            self.rects.append(last[0].union(rect))
+        self.current[key] = (Rect(rect), content)
+
+    def invalidate(self):
+        """
+        Redraw the whole screen next frame
+        """
+        self.everything = True
+
+    def collect(self) -> list[Rect] or None:
+        """
+        Rects that changed this frame, None for everything. Starts the next frame
+        """
+        for key, (rect, _) in self.last.items():
+            if key not in self.current:
+                self.rects.append(rect)
+        rects = None if self.everything else self.rects
+        self.last, self.current = self.current, self.last
+        self.current.clear()
+        self.rects = []
+        self.everything = False
+        return rects
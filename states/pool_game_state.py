@@ -1,195 +1,155 @@
-from math import dist, sqrt
 import math
 from assets import AssetCache
 from entitites.entity import Entity
+from entitites.sprite_atlas import SpriteAtlas
+from states.dirty_regions import DirtyRegions
 from states.state import State
 from pygame import Rect, Surface, Vector2
 import pygame
 from ui import Text
 
-from utils import BASE_SIZE, check_sides, circle_intersection, is_circle_inside_circle, normalize_angle_rads
+from physics import geometry as physics_geometry
+from physics import table as physics_table
+from physics.events import shot_simulator
+from physics.shot_cache import ShotCache
+from physics.preview import TrajectoryPreview
+from physics.replay import ReplayWriter
+from physics.simulation import Simulation, shot_force
+from physics.snapshot import SnapshotRing, TableSnapshot, capture, restore
+from physics.table import OFF_TABLE, BallState, Table, rack_positions, standard_table
+from utils import BASE_SIZE
 
 class Ball(Entity):
-    FRICTION = 0.02
-    RADIUS = 10
-    HOLE_RADIUS = 20
-    TABLE_SIZE = [BASE_SIZE[0], BASE_SIZE[0]/2]
-    def __init__(self, color, position, mass=1) -> None:
-        super().__init__(draw_ball(color), (Ball.RADIUS * 2, Ball.RADIUS * 2), position)
-        self.mass: float = mass
-        self.velocity: Vector2 = Vector2(0,0)
-        self.forces: list[Vector2] = []
-
-    def update(self, delta, **kwargs):
-        self.apply_friction()
-        acceleration: Vector2 = self.sum_forces() / self.mass
-        self.forces.clear()
-        self.velocity += acceleration
-        self.position += self.velocity * delta
-
-        self.collide_walls(delta, kwargs["walls"])
-        self.collide_balls(delta, kwargs["balls"])
-        super().update(delta, **kwargs)
-
-    def get_momentum(self):
-        return self.mass * self.velocity
+    """
+    Sprite view of a BallState, the physics lives in the physics package
+    """
+    FRICTION = physics_table.FRICTION
+    RADIUS = physics_table.BALL_RADIUS
+    HOLE_RADIUS = physics_table.HOLE_RADIUS
+    TABLE_SIZE = list(physics_table.TABLE_SIZE)
+    __slots__ = ("state",)
+
+    def __init__(self, color, state: BallState, atlas: SpriteAtlas) -> None:
+        area = atlas.sprite(color, lambda surface, rect: draw_ball(surface, rect, color))
+        super().__init__(atlas.surface, area.size, state.position, area)
+        self.state = state
+
+    @property
+    def mass(self) -> float:
+        return self.state.mass
 
     def is_moving(self):
-        return self.velocity.magnitude_squared() > 0.05
-
-    def apply_force(self, force: Vector2):
-        self.forces.append(force)
-
-    def sum_forces(self) -> Vector2:
-        s = Vector2(0,0)
-        for force in self.forces:
-            s += force
-        return s
-
-    def sweep_circle(self, delta, ball):
-        current_time = delta
-        intersected = True
-        while current_time > -(delta * 3) and intersected:
-            self_cur_pos = self.get_pos_after_time(current_time)
-            other_cur_pos = ball.get_pos_after_time(current_time)
-            if circle_intersection(self_cur_pos, other_cur_pos, Ball.RADIUS):
-                # Continue
-                current_time -= delta * 0.2
-            else:
-                intersected = False
-                return current_time
-        print("Sweep failed! No time found where intersection absent")    
-
-    def get_pos_after_time(self, delta) -> Vector2:
-        return self.position + (self.velocity * delta)
-
-    def check_sunk(self, holes: list[tuple]) -> bool:
-        for hole in holes:
-            if is_circle_inside_circle((self.position.x, self.position.y), Ball.RADIUS, hole, Ball.HOLE_RADIUS):
-                return True
-        return False
-
-    def collide_walls(self, delta, walls: list[Rect]):
-        # Check for collision next frame
-        my_rect: Rect = self.get_rect()
-        my_rect.x += self.velocity.x * delta
-        my_rect.y += self.velocity.y * delta
-    
-        collided = False
-        for i in range(len(walls)):
-            wall = walls[i]
-            if my_rect.colliderect(wall):
-                collided = True
-                if i == 0: # top
-                    my_rect.top = wall.bottom
-                    self.velocity.y *= -1
-                elif i == 1: # bottom
-                    my_rect.bottom = wall.top
-                    self.velocity.y *= -1
-                elif i == 2: # left
-                    my_rect.left = wall.right
-                    self.velocity.x *= -1
-                elif i == 3: # right
-                    my_rect.right = wall.left
-                    self.velocity.x *= -1
-        if collided:
-            self.position.x = my_rect.centerx
-            self.position.y = my_rect.centery
-
-    def collide_balls(self, delta, balls):
-            # Sweep through time to find the initial intersection point
-            future = self.get_pos_after_time(delta)
-            for ball in balls:
-                if ball == self:
-                    continue
-                if self.check_collided(ball, future, delta):
-                    intersected_time = self.get_intersection_time(ball, delta)
-                    if(intersected_time is None):
-                        intersected_time = 5 * delta # TODO : Find a way to kick balls out that are slowly intersecting
-                    self.position = self.get_pos_after_time(intersected_time)
-                    ball.position = ball.get_pos_after_time(intersected_time)
-                    self.collide_ball(ball)
-
-    def check_collided(self, ball, future_pos, delta) -> bool:
-        future_rect = self.get_rect()
-        future_rect.center = [future_pos.x, future_pos.y]
-        ball_future = ball.get_pos_after_time(delta)
-        ball_rect = ball.get_rect()
-        ball_rect.center = [ball_future.x, ball_future.y]
-        if future_rect.colliderect(ball_rect): # Fast rectangle collision test
-            return circle_intersection(future_pos, ball.get_pos_after_time(delta), Ball.RADIUS)
-        return False
-
-    def get_intersection_time(self, ball, delta) -> float or None:
-        return self.sweep_circle(delta, ball) # Potentially really expensive, we'll see!
-
-    def collide_ball(self, other):
-        difference: Vector2 = self.position - other.position
-        unit_normal = difference.normalize()
-        unit_tangent = Vector2(-unit_normal.y, unit_normal.x)
-
-        # Tangent and normal components of initial velocity (scalar)
-        self_vel_tangent = unit_tangent.dot(self.velocity)
-        self_vel_normal = unit_normal.dot(self.velocity)
-        other_vel_tangent = unit_tangent.dot(other.velocity)
-        other_vel_normal = unit_normal.dot(other.velocity)
-        
-        self_vel_normal_final = ((self_vel_normal)*(self.mass - other.mass) + (2*other.mass*other_vel_normal)) / (self.mass + other.mass)
-        other_vel_normal_final = ((other_vel_normal)*(other.mass - self.mass) + (2*self.mass*self_vel_normal)) / (self.mass + other.mass)
-
-        # Self/other velocity normal/tangent as vectors
-        svn_vector = self_vel_normal_final * unit_normal
-        svt_vector = self_vel_tangent * unit_tangent
-        ovn_vector = other_vel_normal_final * unit_normal
-        ovt_vector = other_vel_tangent * unit_tangent
-
-        self.velocity = svn_vector + svt_vector
-        other.velocity = ovn_vector + ovt_vector
-
-    def fix_intersection(self, ball):
-        return
-        difference: Vector2 = self.position - ball.position
-        optimal_difference = difference.normalize() * Ball.RADIUS * 2
-        # Push both balls out
-        self.position += (optimal_difference / 2)
-        ball.position += (optimal_difference / 2)
+        return self.state.is_moving()
+
+    def sync(self):
+        """
+        Copy the position from the physics state
+        """
+        self.position.update(self.state.position[0], self.state.position[1])
+        super().update(0)
 
     def setPosition(self, pos: Vector2):
-        self.position = pos
+        self.state.position[0] = pos[0]
+        self.state.position[1] = pos[1]
+        self.position.update(pos[0], pos[1])
+        self.snapshot()
         super().update(0)
 
-    def apply_friction(self):
-        self.apply_force(self.velocity * -Ball.FRICTION)
+def bounding_rect(points, margin=0) -> Rect:
+    xs = [p[0] for p in points]
+    ys = [p[1] for p in points]
+    left = math.floor(min(xs)) - margin
+    top = math.floor(min(ys)) - margin
+    return Rect(left, top, math.ceil(max(xs)) + margin - left + 1, math.ceil(max(ys)) + margin - top + 1)
 
-    def get_rect(self):
-        r = Rect(0,0,Ball.RADIUS * 2, Ball.RADIUS * 2)
-        r.centerx = self.position.x
-        r.centery = self.position.y
-        return r
+def draw_ball(surface: Surface, rect: Rect, color):
+    pygame.draw.circle(surface, color, rect.center, Ball.RADIUS)
 
-def draw_ball(color) -> Surface:
-    surf = pygame.Surface((Ball.RADIUS * 2, Ball.RADIUS * 2))
-    pygame.draw.circle(surf, color, surf.get_rect().center, Ball.RADIUS)
-    surf.set_colorkey(surf.get_at((0,0)))
-    return surf
+def ball_atlas() -> SpriteAtlas:
+    """
+    One sprite per ball colour
+    """
+    return SpriteAtlas((Ball.RADIUS * 2, Ball.RADIUS * 2), len(PoolGameState.BALL_COLORS))
 
 class PoolGameState(State):
     POWER_MIN = 1
     POWER_MAX = 100
-    def __init__(self, font) -> None:
+    HISTORY_SIZE = 120 # Physics steps kept for rollback
+    PREVIEW_BUDGET = 0.002 # Seconds per frame spent predicting the aimed shot
+    TURBO_STEPS = 32 # Physics steps per update while fast forwarding, None runs each shot to rest at once
+    TURBO_KEYFRAME = 4 # Updates between frames drawn while fast forwarding
+    MAX_TURBO_STEPS = 100000
+    REPLAY_KEYFRAME = 120 # Physics steps between replay keyframes while balls move
+    opaque = True
+    BALL_COLORS = [
+        (242, 230, 216), #cue ball
+        (242, 224, 82),
+        (112, 156, 255), (217, 41, 214),
+        (72, 4, 110), (242, 235, 99), (232, 162, 32),
+        (68, 161, 42), (176, 36, 32),
+        (38, 8, 7),
+    ]
+    def __init__(self, font, vectorized=False, event_driven=False, broadphase=False, sleeping=False, contacts=False, jaw_radius=None, sandbox=None, turbo=False, replay_path=None) -> None:
         super().__init__()
         self.font = font
         self.balls: list[Ball] = []
+        # Sprite for each ball on the physics table
+        self.views: dict[BallState, Ball] = {}
+        # Sprites of every ball colour, shared by the balls
+        self.atlas: SpriteAtlas = None
         self.aim: Vector2 = Vector2(100, 0)
         self.power: float = 1
         self.mousePos_i = None
         self.walls: list[Rect] = []
         self.holes: list[tuple] = []
 
+        self.table_state: Table = standard_table(BASE_SIZE[1])
+        self.broadphase = broadphase
+        # Resting balls are skipped by the physics step until something reaches them
+        self.sleeping = sleeping
+        # Resolve simultaneous contacts, e.g. the break, as clusters instead of pair by pair
+        self.contacts = contacts
+        # Cut the cushions at the pockets and round them off with jaws of this radius
+        self.jaw_radius = jaw_radius
+        # (layout, count) to fill the table from physics.sandbox instead of the standard rack
+        self.sandbox = sandbox
+        # Fast forward every shot, or only the one being played
+        self.turbo = turbo
+        self.turbo_shot = False
+        self.turbo_frames = 0
+        # Shots and keyframes are appended to this file, see physics.replay
+        if replay_path is not None and (vectorized or event_driven):
+            # physics.replay.play_shot plays shots back with a Simulation
+            raise ValueError("replays can only be recorded with the default physics engine")
+        self.replay_path = replay_path
+        self.replay: ReplayWriter = None
+        self.replay_step = 0
+        self.sim: Simulation = None
+        self.vectorized = vectorized
+        self.physics = None
+        self.event_driven = event_driven
+        self.shot = None
+        self.shot_balls: list[BallState] = []
+        self.shot_pocketed = 0
+        # Outcomes of shots evaluated with evaluate_shot
+        self.shot_cache = ShotCache()
+        # Every ball of the game in a fixed order, with its view, for snapshots
+        self.roster: list[BallState] = []
+        self.roster_views: list[Ball] = []
+        # Snapshot before each physics step, for rollback
+        self.history = SnapshotRing(PoolGameState.HISTORY_SIZE)
+        self.geometry = None
+        self.preview: TrajectoryPreview = None
+        # The balls moved since the preview last saw them
+        self.preview_stale = True
+
         self.table = Rect(10, (BASE_SIZE[1] - Ball.TABLE_SIZE[1]) / 2, Ball.TABLE_SIZE[0], Ball.TABLE_SIZE[1])
         self.table_color = (42, 102, 55)
         self.bg_color = (80, 101, 148)
         self.wall_color = (79, 51, 16)
+        # Felt, pockets and cushions drawn once, rebuilt when table_layer_key changes
+        self.table_layer: Surface = None
+        self.table_layer_key = None
         self.states = {
             "INACTIVE": 0,
             "AIMING": 1,
@@ -198,38 +158,157 @@ class PoolGameState(State):
             "WIN": 4
         }
         self.state = self.states["AIMING"]
+        self.regions = DirtyRegions()
+        # Phase drawn last frame, the UI text depends on it
+        self.drawn_state = None
+        # dirty_regions already spent this frame's preview budget
+        self.preview_updated = False
 
     def on_enter(self, ass_cache: AssetCache):
         self.init_balls(ass_cache)
+        self.roster = list(self.table_state.balls)
+        self.roster_views = [self.views[state] for state in self.roster]
         self.init_walls()
         self.init_holes()
+        self.update_table_layer(BASE_SIZE)
+        if self.jaw_radius is not None:
+            self.geometry = physics_geometry.from_table(self.table_state, self.jaw_radius)
+        self.sim = self.make_simulation(self.table_state)
+        self.preview = TrajectoryPreview(self.make_preview_simulation)
+        if self.replay_path is not None:
+            # Game steps at STEP_RATE, see engine.PHYSICS_RATE
+            self.replay = ReplayWriter(
+                self.replay_path, [state.mass for state in self.roster], physics_table.STEP_RATE,
+                self.broadphase, self.sleeping, self.contacts, self.jaw_radius,
+            )
+            self.replay_step = self.replay.next_step
+        if self.vectorized:
+            self.init_physics()
         self.texts = [
             Text("Waiting...", BASE_SIZE, (50, 5), self.font, (self.wall_color)),
             Text("You scratched! Place the ball with LEFT CLICK", BASE_SIZE, (50, 5), self.font, (self.wall_color)),
             Text("You win!", BASE_SIZE, (50, 5), self.font, (self.wall_color))
         ]
+        # Sandbox layouts can start in motion. Asked of the balls, a sleep tracker
+        # counts every ball as awake until the first step
+        if any(ball.is_moving() for ball in self.table_state.balls):
+            self.state = self.states["INACTIVE"]
         self.updateBalls(0)
 
-    def render(self, screen: pygame.Surface):
-        self.draw_background(screen)
-
-        self.draw_holes(screen)
-        for ball in self.balls:
-            ball.render(screen)
+    def on_exit(self):
+        super().on_exit()
+        if self.replay is not None:
+            self.replay.close()
 
-        self.draw_walls(screen)            
+    def render(self, screen: pygame.Surface):
+        self.update_table_layer(screen.get_size())
+        screen.blit(self.table_layer, (0, 0))
+
+        alpha = self.interpolation
+        drawn = screen.blits([(ball.image, ball.draw_rect(alpha), ball.area) for ball in self.balls])
+
+        # Cushions are drawn over the balls, only the ones a ball overlaps need it again
+        self.draw_walls(screen, drawn)
+        if not self.preview_updated:
+            self.updatePreview()
+        self.preview_updated = False
+        self.drawPreview(screen)
         self.drawAim(screen)
         self.draw_ui(screen)
         super().render(screen)
-    
+
+    def aimPoints(self) -> tuple:
+        pointA = self.getCueBall().position - (self.aim * (Ball.RADIUS * 2 + self.power))
+        pointB = self.getCueBall().position - (self.aim * (Ball.RADIUS * 12 + self.power))
+        return pointA, pointB
+
     def drawAim(self, screen):
         if self.aim is not None:
-            pointA = self.getCueBall().position - (self.aim * (Ball.RADIUS * 2 + self.power))
-            pointB = self.getCueBall().position - (self.aim * (Ball.RADIUS * 12 + self.power))
+            pointA, pointB = self.aimPoints()
             pygame.draw.line(screen, (255,0,0), pointA, pointB)
 
+    def dirty_regions(self):
+        regions = self.regions
+        if self.state != self.drawn_state:
+            self.drawn_state = self.state
+            regions.invalidate()
+        for ball in self.balls:
+            regions.mark(ball, ball.draw_rect(self.interpolation))
+
+        aim = None
+        line = None
+        if self.aim is not None:
+            pointA, pointB = self.aimPoints()
+            aim = bounding_rect((pointA, pointB), 1)
+            # A mirrored line has the same bounding rect
+            line = (tuple(pointA), tuple(pointB))
+        regions.mark("aim", aim, line)
+
+        # The preview has to be advanced before its rect is known
+        self.updatePreview()
+        self.preview_updated = True
+
+        trajectory = self.preview.current if self.preview is not None and not self.preview_stale else None
+        if trajectory is not None:
+            points = list(trajectory.paths[0])
+            if trajectory.contact is not None:
+                points.extend(trajectory.paths[trajectory.contact[1]])
+                ghost = trajectory.contact[0]
+                points.append((ghost[0] - Ball.RADIUS, ghost[1] - Ball.RADIUS))
+                points.append((ghost[0] + Ball.RADIUS, ghost[1] + Ball.RADIUS))
+            # Paths change inside the same rect as the shot changes or the prediction grows
+            regions.mark("preview", bounding_rect(points, 1), (trajectory, trajectory.steps))
+        return regions.collect()
+
+    def make_simulation(self, table: Table) -> Simulation:
+        return Simulation(table, self.broadphase, self.sleeping, self.contacts, self.geometry)
+
+    def make_preview_simulation(self, table: Table) -> Simulation:
+        """
+        Same engine as make_simulation, but resting balls sleep until the shot reaches them,
+        so the preview only steps the balls the cue ball sets moving
+        """
+        return Simulation(table, self.broadphase, True, self.contacts, self.geometry)
+
+    def updatePreview(self):
+        """
+        Spend this frame's preview budget on the shot being aimed
+        """
+        if self.state not in (self.states["AIMING"], self.states["POWER"]) or self.aim is None:
+            self.preview_stale = True
+            return
+        if self.preview_stale:
+            self.preview.reset(self.table_state)
+            self.preview_stale = False
+        self.preview.request(self.aim, self.power)
+        self.preview.work(PoolGameState.PREVIEW_BUDGET)
+
+    def drawPreview(self, screen):
+        trajectory = self.preview.current if self.preview is not None else None
+        if trajectory is None or self.preview_stale:
+            return
+        cue_path = trajectory.paths[0]
+        if len(cue_path) > 1:
+            pygame.draw.lines(screen, (230, 230, 230), False, cue_path)
+        if trajectory.contact is not None:
+            ghost, hit, cue_direction, direction = trajectory.contact
+            pygame.draw.circle(screen, (230, 230, 230), ghost, Ball.RADIUS, 1)
+            hit_path = trajectory.paths[hit]
+            if len(hit_path) > 1:
+                pygame.draw.lines(screen, PoolGameState.BALL_COLORS[hit % len(PoolGameState.BALL_COLORS)], False, hit_path)
+
     def update(self, delta, events):
         keys = pygame.key.get_pressed()
+        for event in events:
+            if event.type == pygame.KEYUP:
+                if event.key == pygame.K_t:
+                    self.turbo = not self.turbo
+                elif event.key == pygame.K_f and self.state == self.states["INACTIVE"]:
+                    self.turbo_shot = True
+        if not (self.turbo or self.turbo_shot):
+            # Turbo may have been turned off on a frame it skipped
+            self.needs_render = True
+
         if self.state == self.states["AIMING"]:
             self.updateAim(events)
         elif self.state == self.states["POWER"]:
@@ -237,30 +316,68 @@ class PoolGameState(State):
         elif self.state == self.states["SCRATCH"]:
             self.updateScratch(events)
         elif self.state == self.states["INACTIVE"]:
-            self.updateInactive(delta)
-
-    def shoot(self):
-        self.getCueBall().apply_force(self.aim * self.power * self.getCueBall().mass * 10)
+            if self.turbo or self.turbo_shot:
+                self.updateTurbo(delta)
+            else:
+                self.updateInactive(delta)
+
+    def shoot(self, turbo=False):
+        """
+        turbo: fast forward this shot
+        """
+        self.turbo_shot = turbo
+        if self.replay is not None:
+            self.replay.keyframe(self.replay_step, self.table_state, self.roster, self.state)
+            self.replay.shot(self.replay_step, self.aim, self.power)
+        # The force is kept on the cue ball in every mode, so a snapshot taken before
+        # the first step still holds the shot, see restore
+        self.sim.apply_force(self.table_state.cue_ball(), shot_force(self.table_state, self.aim, self.power))
+        if self.event_driven:
+            self.start_shot()
+        elif self.physics is not None:
+            self.physics.apply_force(0, self.table_state.cue_ball().force)
         self.aim = None
         self.power = 1
         self.state = self.states["INACTIVE"]
 
+    def start_shot(self):
+        """
+        Play the table back event driven from its current state, including the force pending on the cue ball
+        """
+        self.shot = shot_simulator(self.table_state, self.table_state.cue_ball().force)
+        self.shot_balls = list(self.table_state.balls)
+        self.shot_pocketed = 0
+
+    def evaluate_shot(self, aim, power) -> dict:
+        """
+        Outcome of a shot from the current table without playing it, see simulate_shot.
+        Simulated with the same engine and physics options the state plays with
+        """
+        if self.event_driven:
+            return self.shot_cache.simulate(self.table_state, aim, power, engine="events")
+        if self.vectorized:
+            return self.shot_cache.simulate(self.table_state, aim, power, engine="vector")
+        return self.shot_cache.simulate(
+            self.table_state, aim, power,
+            broadphase=self.broadphase, sleeping=self.sleeping, contacts=self.contacts, geometry=self.geometry,
+        )
+
     def updateAim(self, events: list[pygame.event.Event]):
         for event in events:
             if event.type == pygame.MOUSEMOTION:
-                mousePos = pygame.mouse.get_pos()
+                mousePos = event.pos
                 self.aim = Vector2(mousePos[0] - self.getCueBall().position.x, mousePos[1] - self.getCueBall().position.y).normalize()
             if event.type == pygame.MOUSEBUTTONDOWN:
                 self.state = self.states["POWER"]
-                self.mousePos_i = pygame.mouse.get_pos()
-                
+                self.mousePos_i = event.pos
+
     def updatePower(self, events: list[pygame.event.Event]):
         for event in events:
             if event.type == pygame.MOUSEBUTTONUP:
                 print(f"power = {self.power}")
                 self.shoot()
             elif event.type == pygame.MOUSEMOTION:
-                mousePos = pygame.mouse.get_pos()
+                mousePos = event.pos
                 difference = Vector2(mousePos[0] - self.mousePos_i[0], mousePos[1] - self.mousePos_i[1])
                 mag = -difference.magnitude()
                 if mag == 0:
@@ -269,92 +386,233 @@ class PoolGameState(State):
                     difference.normalize_ip()
                     intendedPower = difference.dot(self.aim) * mag
                 self.power = min(max(intendedPower, PoolGameState.POWER_MIN), PoolGameState.POWER_MAX)
-    
+
     def updateScratch(self, events: list[pygame.event.Event]):
         for event in events:
             if event.type == pygame.MOUSEMOTION:
-                mPos = pygame.mouse.get_pos()
-                self.getCueBall().setPosition(Vector2(mPos[0], mPos[1]))
+                mPos = event.pos
+                self.place_cue(mPos)
             elif event.type == pygame.MOUSEBUTTONDOWN:
-                mPos = pygame.mouse.get_pos()
+                mPos = event.pos
                 if mPos[1] > self.walls[0].bottom + Ball.RADIUS and mPos[1] < self.walls[1].top - Ball.RADIUS:
-                    self.getCueBall().setPosition(Vector2(mPos[0], mPos[1]))
+                    self.place_cue(mPos)
                     self.state = self.states["AIMING"]
 
+    def place_cue(self, pos):
+        self.sim.place(self.table_state.cue_ball(), pos)
+        if self.physics is not None:
+            self.physics.positions[0] = pos
+            self.physics.velocities[0] = 0
+        self.getCueBall().setPosition(Vector2(pos[0], pos[1]))
+
+    def snapshot(self, into: TableSnapshot = None) -> TableSnapshot:
+        """
+        Capture the balls and game phase, see restore
+        """
+        return capture(self.table_state, self.roster, self.state, into)
+
+    def restore(self, snapshot: TableSnapshot):
+        """
+        Return to a snapshot. A shot in progress carries on from it, an event driven
+        one is played back by a new event simulator started from the snapshot
+        """
+        restore(snapshot, self.table_state, self.roster)
+        self.state = snapshot.phase
+        self.preview_stale = True
+        self.regions.invalidate()
+        self.needs_render = True
+        self.turbo_shot = False
+        self.turbo_frames = 0
+        self.shot = None
+        self.shot_balls = []
+        self.sim.reset()
+        if self.physics is not None:
+            self.init_physics()
+        if self.event_driven and self.state == self.states["INACTIVE"]:
+            self.start_shot()
+
+        on_table = set(self.table_state.balls)
+        self.balls = [view for state, view in zip(self.roster, self.roster_views) if state in on_table]
+        self.views = {view.state: view for view in self.balls}
+        for ball in self.balls:
+            ball.sync()
+            ball.snapshot()
+        if self.aim is None:
+            self.aim = Vector2(1, 0)
+
+    def rollback(self, steps: int = 1) -> bool:
+        """
+        Undo the latest physics steps, False if they are no longer in the history
+        """
+        if steps < 1 or steps > len(self.history):
+            return False
+        for _ in range(steps):
+            snapshot = self.history.pop()
+        self.restore(snapshot)
+        return True
+
+    def updateTurbo(self, delta):
+        """
+        Run many physics steps of delta in one update, the same steps normal playback runs
+        """
+        limit = PoolGameState.TURBO_STEPS or PoolGameState.MAX_TURBO_STEPS
+        steps = 0
+        while self.state == self.states["INACTIVE"] and steps < limit:
+            self.updateInactive(delta)
+            steps += 1
+
+        if self.state == self.states["INACTIVE"]:
+            # Only draw every few updates while the shot is still running
+            self.turbo_frames += 1
+            self.needs_render = self.turbo_frames % PoolGameState.TURBO_KEYFRAME == 0
+        else:
+            self.turbo_frames = 0
+            self.turbo_shot = False
+            self.needs_render = True
+
     def updateInactive(self, delta):
+        self.history.push(self.table_state, self.roster, self.state)
+        replay = self.replay
+        # The keyframe written by shoot starts the count
+        if replay is not None and replay.keyframe_step is not None and self.replay_step - replay.keyframe_step >= PoolGameState.REPLAY_KEYFRAME:
+            replay.keyframe(self.replay_step, self.table_state, self.roster, self.state)
+        self.replay_step += 1
+        for state in (self.shot_balls if self.shot is not None else self.sim.awake()):
+            if state in self.views:
+                self.views[state].snapshot()
+
+        if self.shot is not None:
+            self.updateShot(delta)
+            return
+
         self.updateBalls(delta)
 
-        doneWaiting = True
-        for ball in self.balls:
-            if ball.is_moving():
-                doneWaiting = False
-        if doneWaiting:
+        if self.physics is not None:
+            doneWaiting = not self.physics.moving().any()
+        else:
+            doneWaiting = not self.sim.is_moving()
+        # A scratch during the step has already ended the shot
+        if doneWaiting and self.state == self.states["INACTIVE"]:
             self.state = self.states["AIMING"]
             print("Done waiting")
-        
+
     def updateBalls(self, delta):
-        for ball in self.balls:
-            ball.update(delta, walls=self.walls, balls=self.balls)
-            if ball.check_sunk(self.holes):
-                if ball == self.getCueBall():
-                    self.state = self.states["SCRATCH"]
-                    ball.setPosition(Vector2(-50, -50))
-                else:
-                    self.balls.remove(ball)
+        if self.physics is not None:
+            self.updateBallsVectorized(delta)
+            return
+
+        self.remove_sunk(self.sim.step(delta))
+        for state in self.sim.stepped:
+            # Pocketed balls no longer have a view
+            if state in self.views:
+                self.views[state].sync()
+
+    def remove_sunk(self, sunk: list[BallState]):
+        for state in sunk:
+            if state is self.table_state.cue_ball():
+                self.state = self.states["SCRATCH"]
+                self.getCueBall().setPosition(Vector2(OFF_TABLE))
+            else:
+                self.balls.remove(self.views.pop(state))
+
+    def updateShot(self, delta):
+        """
+        Play back an event driven shot, jumping between the events that happen in the next delta seconds
+        """
+        self.shot.advance(delta)
+        # The simulator started with the force shoot left on the cue ball for snapshots
+        cue = self.shot_balls[0].force
+        cue[0] = 0
+        cue[1] = 0
+        for i, state in enumerate(self.shot_balls):
+            if self.shot.active[i]:
+                state.position[:] = self.shot.position(i)
+                state.velocity[:] = self.shot.velocity(i)
+                self.views[state].sync()
+
+        # A scratch only takes effect once the shot is over
+        for i in self.shot.sunk[self.shot_pocketed:]:
+            state = self.shot_balls[i]
+            state.velocity[:] = (0, 0)
+            self.sim.sink(state)
+            if i == 0:
+                self.getCueBall().setPosition(Vector2(OFF_TABLE))
+            else:
+                self.balls.remove(self.views.pop(state))
+        self.shot_pocketed = len(self.shot.sunk)
+
+        if not self.shot.is_moving():
+            self.shot = None
+            self.shot_balls = []
+            self.state = self.states["SCRATCH"] if self.table_state.scratched else self.states["AIMING"]
+            print("Done waiting")
+
+    def updateBallsVectorized(self, delta):
+        sunk = self.physics.step(delta)
+        balls = self.table_state.balls
+        for index in reversed(sunk):
+            state = balls[index]
+            if index == 0:
+                self.physics.positions[0] = OFF_TABLE
+                self.physics.velocities[0] = 0
+            else:
+                self.physics.remove(index)
+            self.sim.sink(state)
+            self.remove_sunk([state])
+
+        for state, position, velocity in zip(balls, self.physics.positions, self.physics.velocities):
+            state.position[:] = position
+            state.velocity[:] = velocity
+            # The step spent every pending force, including the one shoot left on the cue ball
+            state.force[0] = 0
+            state.force[1] = 0
+            self.views[state].sync()
+
+    def init_physics(self):
+        # numpy is only needed for the vectorized engine
+        from physics.vector_engine import from_table
+
+        self.physics = from_table(self.table_state)
 
     def getCueBall(self) -> Ball:
         return self.balls[0]
 
     def init_walls(self):
-        width = 10
-        tw = Ball.TABLE_SIZE[0]
-        th = Ball.TABLE_SIZE[1]
-        margin_top = (BASE_SIZE[1] - th) / 2
-        self.walls.append(Rect(0,margin_top,tw, width)) # top
-        self.walls.append(Rect(0,th - width + margin_top,tw, width)) # bottom
-        self.walls.append(Rect(0,margin_top,width, th)) # left
-        self.walls.append(Rect(tw-width,margin_top,width, th)) # right
+        self.walls = [Rect(wall) for wall in self.table_state.walls]
 
     def init_balls(self, ass_cache):
-        w = BASE_SIZE[0]
-        h = BASE_SIZE[1]
-        r = Ball.RADIUS
-        d = Ball.RADIUS * 2
         # self.balls.append(Ball(ass_cache.get_asset("CropSprite"), (400,200), 1))
-        balls = [
-            Ball((242, 230, 216), (w/4,h/2), 1.005), #cue ball
-
-            Ball((242, 224, 82), (3*w/4,h/2)),
+        self.atlas = ball_atlas()
+        if self.sandbox is not None:
+            self.init_sandbox(*self.sandbox)
+            return
+        for i, (color, position) in enumerate(zip(PoolGameState.BALL_COLORS, rack_positions(BASE_SIZE))):
+            state = self.table_state.add_ball(position, physics_table.CUE_MASS if i == 0 else 1)
+            ball = Ball(color, state, self.atlas)
+            self.views[state] = ball
+            self.balls.append(ball)
+
+    def init_sandbox(self, layout, count):
+        from physics.sandbox import generate
+
+        generate(layout, count, table=self.table_state)
+        colors = PoolGameState.BALL_COLORS
+        for i, state in enumerate(self.table_state.balls):
+            # Object balls cycle through the rack colours
+            ball = Ball(colors[0] if i == 0 else colors[1 + (i - 1) % (len(colors) - 1)], state, self.atlas)
+            self.views[state] = ball
+            self.balls.append(ball)
 
-            Ball((112, 156, 255), (3*w/4 + d,h/2 + r)),
-            Ball((217, 41, 214), (3*w/4 + d,h/2 - r)),
-
-            Ball((72, 4, 110), (3*w/4 + 2*d, h/2)),
-            Ball((242, 235, 99), (3*w/4 + 2*d, h/2 - d)),
-            Ball((232, 162, 32), (3*w/4 + 2*d, h/2 + d)),
-
-            Ball((68, 161, 42), (3*w/4 + 3*d, h/2 + r)),
-            Ball((176, 36, 32), (3*w/4 + 3*d, h/2 - r)),
-
-            Ball((38, 8, 7), (3*w/4 + 4*d, h/2)),
-        ]
-        self.balls.extend(balls)
-    
     def init_holes(self):
-        r = Ball.HOLE_RADIUS
-        margin = 5
-        rm = r + margin
-        w = Ball.TABLE_SIZE[0]
-        h = Ball.TABLE_SIZE[1]
-        tm = (BASE_SIZE[1] - h)/2
-        self.holes = [
-            (rm, rm + tm), (w - rm, rm + tm), (w - rm, h - rm + tm), (rm, h - rm + tm),
-            (w/2, rm + tm), (w/2, h - rm + tm)
-        ]
+        self.holes = self.table_state.holes
 
-    def draw_walls(self, screen):
+    def draw_walls(self, screen, over: list[Rect] = None):
+        """
+        over: only draw the walls touching these rects
+        """
         for wall in self.walls:
-            pygame.draw.rect(screen, self.wall_color, wall)
+            if over is None or wall.collidelist(over) != -1:
+                pygame.draw.rect(screen, self.wall_color, wall)
 
     def draw_holes(self, screen):
         for hole in self.holes:
@@ -364,6 +622,22 @@ class PoolGameState(State):
         screen.fill(self.bg_color)
         screen.fill(self.table_color, self.table)
 
+    def update_table_layer(self, size):
+        """
+        Redraw the static table if the window or the table changed since it was last drawn
+        """
+        key = (tuple(size), tuple(self.table), tuple(tuple(wall) for wall in self.walls), tuple(self.holes))
+        if key == self.table_layer_key:
+            return
+        layer = Surface(size)
+        if pygame.display.get_surface() is not None:
+            layer = layer.convert()
+        self.draw_background(layer)
+        self.draw_holes(layer)
+        self.draw_walls(layer)
+        self.table_layer = layer
+        self.table_layer_key = key
+
     def draw_ui(self, screen):
         if self.state == self.states["INACTIVE"]:
             self.texts[0].draw(screen)
@@ -374,11 +648,10 @@ class PoolGameState(State):
 
     def run_test(self, launch_angle):
         a = math.radians(launch_angle)
-        self.balls[0].position = Vector2(300,200)
-        self.balls[1].position = Vector2(300,400)
+        self.balls[0].setPosition(Vector2(300,200))
+        self.balls[1].setPosition(Vector2(300,400))
 
-        self.balls[0].velocity = Vector2(0,0)
-        self.balls[1].velocity = Vector2(0,0)
+        self.balls[0].state.velocity[:] = (0, 0)
+        self.balls[1].state.velocity[:] = (0, 0)
 
-        self.balls[0].apply_force(Vector2(1000 * math.sin(a), 1000 * math.cos(a)))
-        
+        self.sim.apply_force(self.balls[0].state, (1000 * math.sin(a), 1000 * math.cos(a)))
@@ -4,6 +4,15 @@ from pygame import MOUSEBUTTONUP
 
 
 class State:
+    # Fraction of a physics step the renderer is ahead of the last update, set by Game before rendering
+    interpolation = 1
+    # False skips drawing the frame, e.g. while fast forwarding
+    needs_render = True
+    # Covers the whole screen, states below it aren't rendered
+    opaque = False
+    # States below it aren't updated
+    blocks_update = True
+
     def __init__(self) -> None:
         self.buttons: list[Button] = []
         self.texts: list[Text] = []
@@ -13,6 +22,13 @@ class State:
 
     def render(self, screen):
         pass
+
+    def dirty_regions(self):
+        """
+        Rects of the screen that change when this frame is rendered, None if it could be anything.
+        Only used when Game renders with dirty rects
+        """
+        return None
     
     def on_enter(self, asset_cache:AssetCache):
         """
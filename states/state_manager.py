@@ -15,4 +15,28 @@ class GameStateManager:
         return s
     
     def peek(self) -> State:
-        return self.states[-1]
\ No newline at end of file
+        return self.states[-1]
+
+    def visible(self) -> list[State]:
+        """
+        States to render, bottom first, from the topmost opaque state up
+        """
+        visible = []
+        for state in reversed(self.states):
+            visible.append(state)
+            if state.opaque:
+                break
+        visible.reverse()
+        return visible
+
+    def active(self) -> list[State]:
+        """
+        States to update, bottom first, from the topmost state that blocks updates up
+        """
+        active = []
+        for state in reversed(self.states):
+            active.append(state)
+            if state.blocks_update:
+                break
+        active.reverse()
+        return active
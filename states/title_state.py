@@ -10,6 +10,7 @@ class TitleState(State):
     button_color_2 = Color(124, 143, 196)
     button_text_color = Color(48, 36, 23)
     bgcol = Color(209, 255, 214)
+    opaque = True
 
     def __init__(self, size, font, play_func, quit_func) -> None:
         title_text = Text("P00L", size, (50,25), font, (0,0,0))
@@ -19,6 +20,7 @@ class TitleState(State):
         self.quit_func = quit_func
         self.texts = [title_text]
         self.buttons = [play_button, quit_button]
+        self.drawn = False
 
     def update(self, delta, events):
         for event in events:
@@ -31,6 +33,13 @@ class TitleState(State):
                     # Quit
                     self.quit_func()
     
+    def dirty_regions(self):
+        # Nothing on the title screen moves, only the first frame needs drawing
+        if self.drawn:
+            return []
+        self.drawn = True
+        return None
+
     def render(self, screen):
         screen.fill(self.bgcol)
         self.draw_ui(screen)
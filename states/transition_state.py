@@ -9,12 +9,21 @@ class TransitionState(State):
     IN = True
     OUT = False
 
-    def __init__(self, end, duration: float, color: tuple, size, direction=IN) -> None:
+    def __init__(self, end, duration: float, color: tuple, size, direction=IN, freeze=False, frozen: Surface = None) -> None:
+        """
+        freeze: capture the states below on the first frame and fade that still frame out,
+        instead of rendering them every frame
+        frozen: a still frame to fade out over the states below instead of the color, for crossfades
+        """
         self.end_func = end
         self.duration = duration
         self.color = Color(color)
         self.size = size
         self.direction = direction
+        self.freeze = freeze
+        self.frozen = frozen
+        # The state fading in below a crossfade keeps running
+        self.blocks_update = frozen is None
 
     def update(self, delta, events):
         self.time += delta
@@ -22,14 +31,30 @@ class TransitionState(State):
         if self.time > self.duration:
             self.end_func()
 
-    def render(self, screen:Surface):
+    def alpha(self) -> int:
         if self.direction == TransitionState.OUT:
-            a = int(easeinoutsin(self.time / self.duration) * 255)
-        else:
-            a = int((1 - easeinoutsin(self.time / self.duration)) * 255)
+            return int(easeinoutsin(self.time / self.duration) * 255)
+        return int((1 - easeinoutsin(self.time / self.duration)) * 255)
+
+    @property
+    def opaque(self) -> bool:
+        # Drawing a captured frame, or fully faded, nothing below shows through
+        return (self.freeze and self.frozen is not None) or self.alpha() >= 255
 
-        self.overlay.set_alpha(a)
-        screen.blit(self.overlay, (0,0))
+    def render(self, screen:Surface):
+        a = self.alpha()
+        if self.freeze:
+            if self.frozen is None:
+                self.frozen = screen.copy()
+            screen.fill(self.color)
+            self.frozen.set_alpha(255 - a)
+            screen.blit(self.frozen, (0,0))
+        elif self.frozen is not None:
+            self.frozen.set_alpha(a)
+            screen.blit(self.frozen, (0,0))
+        else:
+            self.overlay.set_alpha(a)
+            screen.blit(self.overlay, (0,0))
     
     def on_enter(self, ass_cache: AssetCache):
         self.color.a = 0
@@ -42,6 +67,7 @@ class TransitionState(State):
         print(f"TransitionState {self.color} on_exit()")
         del self.overlay
         del self.color
+        self.frozen = None
 
     def __repr__(self) -> str:
         if self.direction == TransitionState.IN: